@@ -0,0 +1,33 @@
+"""showtime notifications
+
+Revision ID: 35086d4cf236
+Revises: e40f255fa079
+Create Date: 2026-10-19 01:12:59.593740
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "35086d4cf236"
+down_revision: Union[str, None] = "e40f255fa079"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "showtime_notification",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("member_id", sa.String(), nullable=False),
+        sa.Column("film_id", sa.String(), nullable=False),
+        sa.Column("notified_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("chat_id", "member_id", "film_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("showtime_notification")
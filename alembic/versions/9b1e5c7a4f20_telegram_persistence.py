@@ -0,0 +1,39 @@
+"""telegram persistence
+
+Revision ID: 9b1e5c7a4f20
+Revises: 35086d4cf236
+Create Date: 2026-10-19 14:02:11.318402
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9b1e5c7a4f20"
+down_revision: Union[str, None] = "35086d4cf236"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversation_state",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("state", sa.PickleType(), nullable=False),
+        sa.PrimaryKeyConstraint("name", "key"),
+    )
+    op.create_table(
+        "telegram_user_data",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("data", sa.PickleType(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("telegram_user_data")
+    op.drop_table("conversation_state")
@@ -0,0 +1,39 @@
+"""film table
+
+Revision ID: c048a29347c6
+Revises: d7431a980d28
+Create Date: 2026-10-19 00:58:41.701658
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c048a29347c6"
+down_revision: Union[str, None] = "d7431a980d28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "film",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("release_year", sa.Integer(), nullable=True),
+        sa.Column("rating", sa.Float(), nullable=True),
+        sa.Column("letterboxd_url", sa.String(), nullable=True),
+        sa.Column("directors", sa.JSON(), nullable=True),
+        sa.Column("poster_sizes", sa.JSON(), nullable=True),
+        sa.Column("statistics", sa.JSON(), nullable=True),
+        sa.Column("statistics_updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("seen_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("film")
@@ -0,0 +1,138 @@
+"""cache and lease tables
+
+Adds the tables of the caches, watchlists, cinema programs and shard
+leases. Telegram user and chat ids become BIGINT, and Letterboxd member
+ids strings, since they are like '1ZWr'.
+
+Revision ID: d7431a980d28
+Revises: 0deb28ba2f31
+Create Date: 2026-10-19 02:10:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d7431a980d28"
+down_revision: Union[str, None] = "0deb28ba2f31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cinema_program",
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("cinema", sa.String(), nullable=False),
+        sa.Column("etag", sa.String(), nullable=True),
+        sa.Column("last_modified", sa.String(), nullable=True),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("checked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("city", "cinema"),
+    )
+    op.create_table(
+        "imdb_film",
+        sa.Column("imdb_id", sa.String(), nullable=False),
+        sa.Column("film_id", sa.String(), nullable=True),
+        sa.Column("film_name", sa.String(), nullable=True),
+        sa.Column("resolved_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("imdb_id"),
+    )
+    op.create_table(
+        "notifier_instance",
+        sa.Column("owner", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("owner"),
+    )
+    op.create_table(
+        "notifier_shard_lease",
+        sa.Column("shard", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("owner", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("shard"),
+    )
+    op.create_table(
+        "telegram_file",
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("file_id", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("url"),
+    )
+    op.create_table(
+        "watchlist_film",
+        sa.Column("member_id", sa.String(), nullable=False),
+        sa.Column("film_id", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("member_id", "film_id"),
+    )
+    op.create_table(
+        "watchlist_sync",
+        sa.Column("member_id", sa.String(), nullable=False),
+        sa.Column("synced_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("member_id"),
+    )
+
+    for table in ("follow_member", "popular_todo"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                "chat_id",
+                existing_type=sa.Integer(),
+                type_=sa.BigInteger(),
+                existing_nullable=False,
+            )
+            batch_op.alter_column(
+                "member_id",
+                existing_type=sa.Integer(),
+                type_=sa.String(),
+                existing_nullable=False,
+                postgresql_using="member_id::varchar",
+            )
+    for table in ("chat", "user"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                "id",
+                existing_type=sa.Integer(),
+                type_=sa.BigInteger(),
+                existing_nullable=False,
+            )
+
+
+def downgrade() -> None:
+    for table in ("chat", "user"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                "id",
+                existing_type=sa.BigInteger(),
+                type_=sa.Integer(),
+                existing_nullable=False,
+            )
+    for table in ("follow_member", "popular_todo"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                "member_id",
+                existing_type=sa.String(),
+                type_=sa.Integer(),
+                existing_nullable=False,
+                postgresql_using="member_id::integer",
+            )
+            batch_op.alter_column(
+                "chat_id",
+                existing_type=sa.BigInteger(),
+                type_=sa.Integer(),
+                existing_nullable=False,
+            )
+
+    op.drop_table("watchlist_sync")
+    op.drop_table("watchlist_film")
+    op.drop_table("telegram_file")
+    op.drop_table("notifier_shard_lease")
+    op.drop_table("notifier_instance")
+    op.drop_table("imdb_film")
+    op.drop_table("cinema_program")
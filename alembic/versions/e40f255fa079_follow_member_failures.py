@@ -0,0 +1,38 @@
+"""follow member failures
+
+Revision ID: e40f255fa079
+Revises: c048a29347c6
+Create Date: 2026-10-19 01:02:49.989933
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e40f255fa079"
+down_revision: Union[str, None] = "c048a29347c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("follow_member", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("failure_count", sa.Integer(), server_default="0", nullable=False)
+        )
+        batch_op.add_column(
+            sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True)
+        )
+        batch_op.add_column(
+            sa.Column("quarantined_at", sa.DateTime(timezone=True), nullable=True)
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("follow_member", schema=None) as batch_op:
+        batch_op.drop_column("quarantined_at")
+        batch_op.drop_column("next_attempt_at")
+        batch_op.drop_column("failure_count")
@@ -0,0 +1,169 @@
+"""Micro-benchmark for building activity captions.
+
+Compares CaptionBuilder against the previous string concatenation that
+escaped every fragment separately, after checking both produce the same
+MarkdownV2.
+
+    python -m benchmarks.caption
+"""
+
+import math
+import random
+import timeit
+
+from letterboxd_followbot.telegram.caption import CaptionBuilder
+from letterboxd_followbot.telegram.util import Util as TelegramUtil
+
+
+def synthetic_film(rng: random.Random, film_id: int) -> tuple[dict, dict]:
+    film = {
+        "id": f"f{film_id}",
+        "name": f"Film No. {film_id} (Director's Cut) - Part {film_id % 3}!",
+        "releaseYear": 1950 + film_id % 75,
+        "rating": rng.uniform(0.5, 5.0),
+        "links": [
+            {"type": "letterboxd", "url": f"https://boxd.it/{film_id}"},
+            {"type": "tmdb", "url": f"https://tmdb.org/{film_id}"},
+        ],
+        "directors": [{"name": f"Dir_{n}. Smith"} for n in range(film_id % 3 + 1)],
+    }
+    film_stats = {
+        "ratingsHistogram": [{"count": rng.randint(0, 50_000)} for _ in range(10)],
+        "counts": {
+            "watches": rng.randint(0, 5_000_000),
+            "likes": rng.randint(0, 1_000_000),
+            "reviews": rng.randint(0, 100_000),
+        },
+    }
+    return film, film_stats
+
+
+def synthetic_log_entry(rng: random.Random) -> dict:
+    log_entry = {
+        "rating": rng.randint(1, 10) / 2,
+        "like": rng.random() < 0.5,
+        "diaryDetails": {"rewatch": rng.random() < 0.2},
+        "tags2": [{"displayTag": f"tag-{n}"} for n in range(rng.randint(0, 4))],
+    }
+    if rng.random() < 0.3:
+        log_entry["review"] = {"text": "..."}
+    return log_entry
+
+
+def caption_concat(member: dict, log_entry: dict, film: dict, film_stats: dict) -> str:
+    def star_string(rating):
+        full_stars = math.floor(rating)
+        return "★" * full_stars + "½" * math.ceil(rating - full_stars)
+
+    def round_number_with_suffix(number):
+        suffixes = ["", "K", "M", "B"]
+        suffix_index = 0
+        while number >= 1000:
+            number /= 1000
+            suffix_index += 1
+        return f"{round(number, 1)}{suffixes[suffix_index]}"
+
+    def histogram(ratings_histogram):
+        result = ""
+        biggest_count = max(map(lambda r: r["count"], ratings_histogram))
+        chars = "　▁▂▃▄▅▆▇█"
+        if biggest_count == 0:
+            result = "　　　　　　　　　　"
+        else:
+            for rating in ratings_histogram:
+                result += f"{chars[math.ceil(rating['count']/biggest_count*8)]}"
+        return "[" + result + "]"
+
+    caption = "📖 {} added to {} diary:\n".format(
+        TelegramUtil.escape_md(member["displayName"]),
+        TelegramUtil.escape_md(member["pronoun"]["possessiveAdjective"]),
+    )
+
+    line = ""
+    if "rating" in log_entry:
+        line += TelegramUtil.escape_md(f"{star_string(log_entry['rating'])}")
+    if "like" in log_entry and log_entry["like"]:
+        line += TelegramUtil.escape_md(" ❤️")
+    if "diaryDetails" in log_entry and log_entry["diaryDetails"]["rewatch"]:
+        line += TelegramUtil.escape_md(" 🔄")
+    if "review" in log_entry:
+        line += TelegramUtil.escape_md(" 📝")
+    caption += f"{line.strip()}\n"
+    if len(log_entry["tags2"]) > 0:
+        first = True
+        for tag in log_entry["tags2"]:
+            caption += TelegramUtil.escape_md(
+                f"{" " if not first else ""}#{tag['displayTag']}"
+            )
+            first = False
+        caption += "\n"
+    caption += "\n"
+
+    letterboxd_link = ""
+    for link in film["links"]:
+        if link["type"] == "letterboxd":
+            letterboxd_link = link["url"]
+            break
+    caption += "[{}]({})".format(TelegramUtil.escape_md(film["name"]), letterboxd_link)
+    if "releaseYear" in film:
+        caption += " \\({}\\)".format(film["releaseYear"])
+    caption += "\n"
+    if "directors" in film and len(film["directors"]) > 0:
+        line = TelegramUtil.escape_md(f"{film['directors'][0]['name']}")
+        if len(film["directors"]) > 1:
+            line += TelegramUtil.escape_md(f" +{len(film['directors']) - 1}")
+        caption += f"{line}\n"
+    caption += TelegramUtil.escape_md(histogram(film_stats["ratingsHistogram"]))
+    if "rating" in film:
+        caption += TelegramUtil.escape_md(f" {round(film['rating'], 1)}")
+    caption += "\n"
+    caption += TelegramUtil.escape_md(
+        "👁️ {} ❤️ {} 🗒️ {}\n".format(
+            round_number_with_suffix(film_stats["counts"]["watches"]),
+            round_number_with_suffix(film_stats["counts"]["likes"]),
+            round_number_with_suffix(film_stats["counts"]["reviews"]),
+        )
+    )
+    return caption
+
+
+def caption_builder(member: dict, log_entry: dict, film: dict, film_stats: dict) -> str:
+    caption = CaptionBuilder()
+    caption.line(
+        "📖 {} added to {} diary:".format(
+            member["displayName"], member["pronoun"]["possessiveAdjective"]
+        )
+    )
+    caption.log_lines(log_entry)
+    caption.line()
+    caption.film_lines(film, film_stats)
+    return caption.build()
+
+
+def main():
+    rng = random.Random(1234)
+    member = {"displayName": "Jane_Doe (JD)", "pronoun": {"possessiveAdjective": "her"}}
+    films = [synthetic_film(rng, film_id) for film_id in range(200)]
+    # Popular films show up repeatedly within a cycle
+    samples = [
+        (member, synthetic_log_entry(rng), *rng.choice(films)) for _ in range(2000)
+    ]
+
+    for sample in samples:
+        expected = caption_concat(*sample)
+        actual = caption_builder(*sample)
+        if expected != actual:
+            raise AssertionError(f"Caption mismatch:\n{expected!r}\n{actual!r}")
+    print(f"{len(samples)} captions are identical")
+
+    old = timeit.timeit(lambda: [caption_concat(*s) for s in samples], number=5)
+    new = timeit.timeit(lambda: [caption_builder(*s) for s in samples], number=5)
+    count = len(samples) * 5
+    print(
+        f"concat {old / count * 1e6:.1f} µs, builder {new / count * 1e6:.1f} µs "
+        f"per caption ({old / new:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
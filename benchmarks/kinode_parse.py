@@ -0,0 +1,107 @@
+"""Benchmark parsing of kino.de cinema program pages.
+
+Compares the previous full-page html.parser path against the current
+backend (lxml when installed) restricted to the ul.cinema-movies subtree.
+Pass saved program pages as arguments, otherwise synthetic pages with the
+same structure are generated.
+
+    python -m benchmarks.kinode_parse [page.html ...]
+"""
+
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from letterboxd_followbot.kinode import HTML_PARSER, KinoDeScaper
+
+PAGE_HEADER = "<html><head><title>Kinoprogramm</title>{scripts}</head><body>{nav}"
+PAGE_FOOTER = "{teasers}</body></html>"
+
+MOVIE = """
+<li class="cinema-movie">
+  <div class="alice-teaser-image"><img data-src="//img.kino.de/poster/{n}.jpg"></div>
+  <div class="alice-teaser-title">
+    <a class="alice-teaser-link" href="//www.kino.de/film/film-{n}/">Film {n}</a>
+  </div>
+  <ol class="schedules-container" data-cinema-name="Kino Beispiel">
+    {playtimes}
+  </ol>
+</li>
+"""
+
+PLAYTIME = (
+    '<li class="schedule-playtime"><a href="https://shop.example/?imdb=tt{n:07d}'
+    '&showtime_date={ts}">{hour}:00</a></li>'
+)
+
+
+def synthetic_page(movies: int, playtimes: int) -> str:
+    scripts = "<script>var config = {};</script>" * 50
+    nav = "<nav><ul>" + "<li><a href='/x'>Link</a></li>" * 200 + "</ul></nav>"
+    teasers = "<div class='teaser'><p>Lorem ipsum dolor sit amet</p></div>" * 300
+    program = "".join(
+        MOVIE.format(
+            n=n,
+            playtimes="".join(
+                PLAYTIME.format(n=n, ts=1_735_689_600 + p * 3600, hour=p % 24)
+                for p in range(playtimes)
+            ),
+        )
+        for n in range(movies)
+    )
+    return (
+        PAGE_HEADER.format(scripts=scripts, nav=nav)
+        + f'<ul class="cinema-movies">{program}</ul>'
+        + PAGE_FOOTER.format(teasers=teasers)
+    )
+
+
+def parse_full_page(scraper: KinoDeScaper, text: str) -> list:
+    soup = BeautifulSoup(text, "html.parser")
+    return scraper._parse_cinema_program(soup, "city", "cinema")
+
+
+def parse_program(scraper: KinoDeScaper, text: str) -> list:
+    return scraper._parse_cinema_program(scraper._parse_html(text), "city", "cinema")
+
+
+def summary(films: list) -> list:
+    return [
+        (film.title, film.imdb_id, [p.showtime for p in film.playtimes])
+        for film in films
+    ]
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = {}
+        for path in sys.argv[1:]:
+            with open(path, encoding="utf-8") as page:
+                pages[path] = page.read()
+    else:
+        pages = {
+            f"synthetic {movies}x{playtimes}": synthetic_page(movies, playtimes)
+            for movies, playtimes in ((10, 5), (40, 20))
+        }
+
+    scraper = KinoDeScaper()
+    print(f"Backend: {HTML_PARSER}")
+
+    for name, text in pages.items():
+        if summary(parse_full_page(scraper, text)) != summary(
+            parse_program(scraper, text)
+        ):
+            raise AssertionError(f"Parsed films differ for {name}")
+
+        number = 20
+        old = timeit.timeit(lambda: parse_full_page(scraper, text), number=number)
+        new = timeit.timeit(lambda: parse_program(scraper, text), number=number)
+        print(
+            f"{name} ({len(text) // 1024} KiB): html.parser {old / number * 1e3:.1f} ms, "
+            f"{HTML_PARSER} + strainer {new / number * 1e3:.1f} ms ({old / new:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""End-to-end throughput of notify() and todo_popular() without network.
+
+Letterboxd is replaced by an httpx MockTransport serving synthetic members,
+activity pages, film statistics and popular/watched film lists, and
+Telegram by an ExtBot whose send methods only count. Both can add a fixed
+latency per call. The 4 second pauses between sends and the sleeps between
+cycles are skipped and reported instead.
+
+For every number of follows, notify() runs one cycle with new activities
+and one idle cycle, then todo_popular() runs once, each on a fresh
+database in a temporary directory.
+With --film-store the client keeps films and their statistics in the
+film table, as the notifier does.
+
+    python -m benchmarks.notify_throughput [--follows 10 100 1000]
+        [--activities 3] [--letterboxd-latency 0] [--telegram-latency 0]
+        [--film-store]
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Callable
+from urllib.parse import parse_qs
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from telegram.ext import ExtBot
+
+from letterboxd_followbot import metrics
+from letterboxd_followbot.context import app_context
+from letterboxd_followbot.database.model import (
+    Base,
+    Chat,
+    FollowMember,
+    FollowMemberType,
+    PopularTodo,
+)
+from letterboxd_followbot.letterboxd.api import LetterboxdClient
+from letterboxd_followbot.letterboxd.film import FilmStore
+import notify
+
+BASE_URL = "https://letterboxd.invalid/api/v0"
+FILMS = 500
+WATCHED_FILMS = 150
+ACTIVITY_PAGE_SIZE = 20
+LAST_CHECKED_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+ACTIVITY_TYPES = [
+    "DiaryEntryActivity",
+    "ReviewActivity",
+    "WatchlistActivity",
+    "FilmLikeActivity",
+    "FilmRatingActivity",
+]
+REVIEW_TEXT = (
+    "<p>A <b>slow</b> burn that pays off.<br>The last act is <i>great</i>, "
+    "see <a href='https://example.com'>this</a> &amp; more.</p><p>8/10</p>"
+)
+
+
+def synthetic_film(n: int) -> dict:
+    return {
+        "id": f"f{n}",
+        "name": f"Film {n}: The Sequel",
+        "releaseYear": 1950 + n % 75,
+        "rating": 0.5 + n % 10 * 0.45,
+        "links": [{"type": "letterboxd", "url": f"https://boxd.it/f{n}"}],
+        "directors": [{"name": f"Director {n % 40}"}],
+        "poster": {
+            "sizes": [
+                {"width": w, "height": w * 3 // 2, "url": f"https://a.invalid/{n}-{w}"}
+                for w in (70, 150, 230, 500, 1000, 2000)
+            ]
+        },
+    }
+
+
+def synthetic_member(member_id: str) -> dict:
+    return {
+        "id": member_id,
+        "username": f"user_{member_id}",
+        "displayName": f"User {member_id}",
+        "pronoun": {"possessiveAdjective": "their"},
+    }
+
+
+def synthetic_activity(member_id: str, index: int, when: datetime) -> dict:
+    activity_type = ACTIVITY_TYPES[index % len(ACTIVITY_TYPES)]
+    film = synthetic_film((int(member_id[1:]) * 7 + index) % FILMS)
+    activity = {
+        "type": activity_type,
+        "whenCreated": when.isoformat(),
+        "member": synthetic_member(member_id),
+    }
+    log_entry = {
+        "film": film,
+        "rating": 0.5 + index % 10 * 0.5,
+        "like": index % 3 == 0,
+        "diaryDetails": {"rewatch": index % 4 == 0},
+        "tags2": [{"displayTag": "benchmark"}] if index % 2 else [],
+    }
+    if activity_type == "DiaryEntryActivity":
+        if index % 2 == 0:
+            log_entry["review"] = {"text": REVIEW_TEXT, "containsSpoilers": False}
+        activity["diaryEntry"] = log_entry
+    elif activity_type == "ReviewActivity":
+        log_entry["review"] = {"text": REVIEW_TEXT, "containsSpoilers": True}
+        activity["review"] = log_entry
+    else:
+        activity["film"] = film
+        activity["rating"] = log_entry["rating"]
+    return activity
+
+
+class FakeLetterboxd:
+    """Serves the Letterboxd endpoints LetterboxdClient uses."""
+
+    def __init__(self, activities_per_member: int, latency: float) -> None:
+        self.activities_per_member = activities_per_member
+        self.latency = latency
+        self.calls = Counter()
+        self.__activities: dict[str, list[dict]] = {}
+        self.__films = [synthetic_film(n) for n in range(FILMS)]
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = request.url.path.removeprefix("/api/v0").strip("/").split("/")
+        params = {
+            key: values[0] if len(values) == 1 else values
+            for key, values in parse_qs(request.url.query.decode()).items()
+        }
+
+        if path == ["auth", "token"]:
+            endpoint, body = "auth", {"access_token": "token", "expires_in": 3600}
+        elif path[0] == "member" and len(path) == 3 and path[2] == "activity":
+            endpoint, body = "member_activity", self.activity_page(path[1], params)
+        elif path[0] == "member" and len(path) == 2:
+            endpoint, body = "member", synthetic_member(path[1])
+        elif path[0] == "film" and path[2:] == ["statistics"]:
+            endpoint, body = "film_statistics", self.film_statistics(path[1])
+        elif path == ["films"]:
+            endpoint, body = "films", self.films(params)
+        else:
+            return httpx.Response(404)
+
+        self.calls[endpoint] += 1
+        return httpx.Response(200, json=body)
+
+    def activity_page(self, member_id: str, params: dict) -> dict:
+        activities = self.__activities.get(member_id)
+        if activities is None:
+            activities = [
+                synthetic_activity(
+                    member_id, index, LAST_CHECKED_AT + timedelta(minutes=index + 1)
+                )
+                for index in range(self.activities_per_member)
+            ]
+            activities.reverse()
+            self.__activities[member_id] = activities
+
+        return self.page(activities, params.get("cursor"), ACTIVITY_PAGE_SIZE)
+
+    def film_statistics(self, film_id: str) -> dict:
+        n = int(film_id[1:])
+        return {
+            "ratingsHistogram": [
+                {"count": (n * 37 + i * 101) % 997} for i in range(10)
+            ],
+            "counts": {"watches": n * 1234, "likes": n * 321, "reviews": n * 12},
+        }
+
+    def films(self, params: dict) -> dict:
+        if params.get("memberRelationship") == "Watched":
+            films = self.__films[:WATCHED_FILMS]
+        else:
+            films = self.__films
+        return self.page(films, params.get("cursor"), int(params.get("perPage", 20)))
+
+    @staticmethod
+    def page(items: list, cursor: str | None, per_page: int) -> dict:
+        start = int(cursor) if cursor else 0
+        page = {"items": items[start : start + per_page]}
+        if start + per_page < len(items):
+            page["next"] = str(start + per_page)
+        return page
+
+
+class FakeBot(ExtBot):
+    """ExtBot that counts sends instead of calling the Bot API."""
+
+    def __init__(self, latency: float) -> None:
+        super().__init__("0:benchmark")
+        # Bot objects are frozen after __init__
+        with self._unfrozen():
+            self.latency = latency
+            self.calls = Counter()
+
+    async def __send(self, method: str) -> SimpleNamespace:
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        file_id = f"file{self.calls.total()}"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+    async def send_message(self, *args, **kwargs):
+        return await self.__send("send_message")
+
+    async def send_photo(self, *args, **kwargs):
+        return await self.__send("send_photo")
+
+    async def send_media_group(self, chat_id, media, *args, **kwargs):
+        message = await self.__send("send_media_group")
+        return [message] * len(media)
+
+
+class CycleEnd(Exception):
+    pass
+
+
+class FakeAsyncio:
+    """Stands in for the asyncio module inside notify.
+
+    Pauses between sends return immediately and are only summed up. A
+    sleep between cycles takes a snapshot of the counters and ends the job
+    once the requested number of cycles ran.
+    """
+
+    def __init__(self, cycles: int, snapshot: Callable[[], tuple]) -> None:
+        self.cycles = cycles
+        self.snapshot = snapshot
+        self.snapshots = [snapshot()]
+        self.skipped_pauses = 0.0
+
+    def __getattr__(self, name: str):
+        return getattr(asyncio, name)
+
+    async def sleep(self, seconds: float) -> None:
+        if seconds <= 4:
+            self.skipped_pauses += seconds
+            await asyncio.sleep(0)
+            return
+
+        self.snapshots.append(self.snapshot())
+        if len(self.snapshots) > self.cycles:
+            raise CycleEnd()
+
+
+def setup_database(directory: str, follows: int) -> None:
+    app_context.engine = create_engine(f"sqlite:///{directory}/benchmark.db")
+    Base.metadata.create_all(app_context.engine)
+
+    with Session(app_context.engine) as session:
+        for n in range(follows):
+            session.add(Chat(id=n + 1, title=f"Chat {n + 1}", type="private"))
+            session.add(
+                FollowMember(
+                    chat_id=n + 1,
+                    member_id=f"m{n}",
+                    type=FollowMemberType.MEMBER,
+                    last_checked_at=LAST_CHECKED_AT,
+                )
+            )
+            session.add(PopularTodo(chat_id=n + 1, member_id=f"m{n}"))
+        session.commit()
+
+
+async def run_job(
+    notify,
+    job,
+    cycles: int,
+    letterboxd: FakeLetterboxd,
+    letterboxd_client: LetterboxdClient,
+    bot: FakeBot,
+):
+    """Runs job for the given number of cycles and returns per cycle
+    (seconds, events, Letterboxd calls, Telegram calls) and the skipped
+    pauses between sends."""
+
+    def snapshot() -> tuple:
+        return (
+            time.perf_counter(),
+            sum(metrics.ACTIVITIES_FOUND.values.values()),
+            sum(letterboxd.calls.values()),
+            sum(bot.calls.values()),
+        )
+
+    fake_asyncio = FakeAsyncio(cycles, snapshot)
+    notify.asyncio = fake_asyncio
+    app_context.application = SimpleNamespace(bot=bot)
+    try:
+        await job(
+            notify.PosterSelector.from_config(),
+            notify.FileIdCache(app_context.engine),
+            letterboxd_client,
+        )
+    except CycleEnd:
+        pass
+    finally:
+        notify.asyncio = asyncio
+
+    snapshots = fake_asyncio.snapshots
+    cycles = [
+        tuple(after[i] - before[i] for i in range(4))
+        for before, after in zip(snapshots, snapshots[1:])
+    ]
+    return cycles, fake_asyncio.skipped_pauses
+
+
+def report(name: str, cycle: tuple, follows: int) -> None:
+    seconds, events, api_calls, telegram_calls = cycle
+    print(
+        f"  {name:<16} {seconds:8.3f} s  {events:6} events "
+        f"{events / seconds:9.1f} events/s  {api_calls:6} API calls "
+        f"({api_calls / follows:.1f}/follow)  {telegram_calls:6} sends"
+    )
+
+
+async def benchmark(notify, args: argparse.Namespace, follows: int) -> None:
+    letterboxd = FakeLetterboxd(args.activities, args.letterboxd_latency / 1000)
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_database(directory, follows)
+        letterboxd_client = LetterboxdClient(
+            "id",
+            "secret",
+            base_url=BASE_URL,
+            transport=letterboxd.transport(),
+            film_store=FilmStore(app_context.engine) if args.film_store else None,
+        )
+        bot = FakeBot(args.telegram_latency / 1000)
+
+        print(f"{follows} follows, {args.activities} new activities each")
+        cycles, pauses = await run_job(
+            notify, notify.notify, 2, letterboxd, letterboxd_client, bot
+        )
+        report("notify", cycles[0], follows)
+        report("notify (idle)", cycles[1], follows)
+        print(f"  {'':<16} skipped {pauses:.0f} s of pauses between sends")
+
+        cycles, pauses = await run_job(
+            notify, notify.todo_popular, 1, letterboxd, letterboxd_client, bot
+        )
+        # Every popular todo message counts as an event here
+        seconds, _, api_calls, telegram_calls = cycles[0]
+        report(
+            "todo_popular",
+            (seconds, telegram_calls, api_calls, telegram_calls),
+            follows,
+        )
+        print(f"  {'':<16} skipped {pauses:.0f} s of pauses between sends")
+
+        app_context.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--follows", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--activities", type=int, default=3)
+    parser.add_argument("--letterboxd-latency", type=float, default=0, metavar="MS")
+    parser.add_argument("--telegram-latency", type=float, default=0, metavar="MS")
+    parser.add_argument("--film-store", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for follows in args.follows:
+        asyncio.run(benchmark(notify, args, follows))
+
+
+if __name__ == "__main__":
+    main()
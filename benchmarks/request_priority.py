@@ -0,0 +1,132 @@
+"""Latency of interactive Letterboxd requests under full background load.
+
+Background threads keep polling activity feeds at NOTIFICATION and
+POPULAR_TODO priority through one LetterboxdClient, while member searches
+are made at a fixed interval. Letterboxd is an httpx MockTransport with a
+fixed latency per call. The run is repeated with all requests in one
+queue (no reserved slots, one priority) and with the priority lanes, and
+the search latencies and background throughput of both are printed.
+
+    python -m benchmarks.request_priority [--background 16] [--capacity 4]
+        [--reserved 1] [--latency 50] [--searches 20]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import httpx
+
+from letterboxd_followbot.letterboxd.api import LetterboxdClient
+from letterboxd_followbot.letterboxd.scheduler import (
+    RequestPriority,
+    RequestScheduler,
+    priority,
+)
+
+BASE_URL = "https://letterboxd.invalid/api/v0"
+
+
+def transport(latency: float) -> httpx.MockTransport:
+    def handle(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        if request.url.path.endswith("/auth/token"):
+            return httpx.Response(
+                200, json={"access_token": "token", "expires_in": 3600}
+            )
+        return httpx.Response(200, json={"items": []})
+
+    return httpx.MockTransport(handle)
+
+
+def background(
+    client: LetterboxdClient,
+    request_priority: RequestPriority,
+    stop: threading.Event,
+    done: list[int],
+) -> None:
+    with priority(request_priority):
+        while not stop.is_set():
+            client.get_member_own_activity("m0")
+            done.append(1)
+
+
+def run(args: argparse.Namespace, lanes: bool) -> None:
+    scheduler = RequestScheduler(args.capacity, args.reserved if lanes else 0)
+    client = LetterboxdClient(
+        "id",
+        "secret",
+        base_url=BASE_URL,
+        transport=transport(args.latency / 1000),
+        scheduler=scheduler,
+    )
+    client.get_member("m0")
+
+    stop = threading.Event()
+    done = []
+    threads = [
+        threading.Thread(
+            target=background,
+            args=(
+                client,
+                (
+                    RequestPriority.POPULAR_TODO
+                    if lanes and n % 2 == 1
+                    else RequestPriority.NOTIFICATION
+                ),
+                stop,
+                done,
+            ),
+        )
+        for n in range(args.background)
+    ]
+    for thread in threads:
+        thread.start()
+
+    search_priority = (
+        RequestPriority.INTERACTIVE if lanes else RequestPriority.NOTIFICATION
+    )
+    latencies = []
+    start = time.perf_counter()
+    with priority(search_priority):
+        for _ in range(args.searches):
+            time.sleep(args.latency / 1000)
+            search_start = time.perf_counter()
+            client.search("member", include=["MemberSearchItem"])
+            latencies.append(time.perf_counter() - search_start)
+    seconds = time.perf_counter() - start
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print(
+        f"  {'priority lanes' if lanes else 'single queue':<16} "
+        f"search p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms  "
+        f"max {latencies[-1] * 1000:7.1f} ms  "
+        f"background {len(done) / seconds:7.1f} requests/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--background", type=int, default=16, metavar="THREADS")
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--reserved", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=50, metavar="MS")
+    parser.add_argument("--searches", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{args.background} background threads, {args.capacity} slots, "
+        f"{args.latency:.0f} ms per request"
+    )
+    run(args, lanes=False)
+    run(args, lanes=True)
+
+
+if __name__ == "__main__":
+    main()
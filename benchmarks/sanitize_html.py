@@ -0,0 +1,137 @@
+"""Compare Util.sanitize_html against the previous BeautifulSoup implementation.
+
+Every sample (hand-written golden cases plus randomly generated markup) must
+produce identical output before the timings are reported.
+
+    python -m benchmarks.sanitize_html
+"""
+
+import random
+import timeit
+
+from bs4 import BeautifulSoup
+
+from letterboxd_followbot.telegram.util import Util
+
+ALLOWED_TAGS = [
+    "b",
+    "strong",
+    "i",
+    "em",
+    "u",
+    "ins",
+    "s",
+    "strike",
+    "span",
+    "tg-spoiler",
+    "tg-emoji",
+    "a",
+    "code",
+    "pre",
+    "blockquote",
+]
+
+GOLDEN_SAMPLES = [
+    "",
+    "plain text",
+    "Tom &amp; Jerry &lt;3 &gt; all",
+    "a & b < c > d",
+    "<p>First paragraph.</p><p>Second <b>bold</b> and <i>italic</i>.</p>",
+    "line one<br>line two<br/>line three<br />line four<BR>five",
+    "<tg-spoiler><p>He was <em>dead</em> all along</p></tg-spoiler>",
+    '<a href="https://letterboxd.com/film/x/?a=1&b=2" rel="nofollow  noopener">link</a>',
+    '<a title=\'say "hi"\' href=x>q</a><a title="it\'s">r</a>',
+    "<a title=\"'both' &quot;quotes&quot;\">s</a>",
+    "<span class='  spoiler   big '>x</span><span class=\"\">y</span>",
+    "<b><i>overlap</b> rest</i>",
+    "<b>never closed <i>nested",
+    "stray </b> end </p> tags",
+    "<p>   </p><p>\n\n  </p><pre>   keep   </pre>",
+    "<!-- comment -->text<!--   -->",
+    "<!DOCTYPE html><html><body><h1>Title</h1></body></html>",
+    "<![CDATA[raw]]>",
+    "<?xml version='1.0'?>x",
+    "<script>if (a < b && c) {}</script><style>p > b {}</style>",
+    "&nbsp;&eacute;&#233;&#x263A;&#147;quoted&#148;&#129;&unknown;&amp",
+    "<ul><li>one<li>two</ul>",
+    "<img src=x.png>after<input/>then</input><br></br>",
+    "<b/>self closing<span />",
+    "<blockquote>quote <code>code</code></blockquote>",
+    '<a href="x" href="y" HREF="z">dupes</a>',
+    "unterminated <b attr",
+    "<p>ünïcödé ★½ ❤️ 🔄</p>",
+]
+
+_RANDOM_TAGS = ALLOWED_TAGS + ["p", "div", "br", "img", "pre", "h1", "ul", "li"]
+_RANDOM_TEXT = ["word", " ", "\n", "  \n ", "&amp;", "&lt;", "<", ">", "&", "&#39;"]
+
+
+def sanitize_html_bs4(text: str) -> str:
+    text = text.replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
+
+    soup = BeautifulSoup(text, "html.parser")
+    for e in soup.find_all():
+        if e.name not in ALLOWED_TAGS:
+            e.unwrap()
+    return str(soup)
+
+
+def random_markup(rng: random.Random, length: int) -> str:
+    parts = []
+    for _ in range(length):
+        choice = rng.random()
+        tag = rng.choice(_RANDOM_TAGS)
+        if choice < 0.25:
+            attrs = rng.choice(["", ' class="a  b"', " href='x&y'", ' title="q\'"'])
+            parts.append(f"<{tag}{attrs}>")
+        elif choice < 0.45:
+            parts.append(f"</{tag}>")
+        elif choice < 0.5:
+            parts.append(f"<{tag}/>")
+        else:
+            parts.append(rng.choice(_RANDOM_TEXT))
+    return "".join(parts)
+
+
+def review_markup(paragraphs: int) -> str:
+    paragraph = (
+        "<p>This is a <b>long</b> review with <i>some</i> emphasis, a "
+        '<a href="https://letterboxd.com/film/parasite-2019/">link</a> and '
+        "characters like &amp;, &lt; and &gt;.<br>A second line follows here.</p>"
+    )
+    return paragraph * paragraphs
+
+
+def check_golden() -> int:
+    samples = list(GOLDEN_SAMPLES)
+    rng = random.Random(4711)
+    samples.extend(random_markup(rng, rng.randint(1, 60)) for _ in range(5000))
+
+    for sample in samples:
+        expected = sanitize_html_bs4(sample)
+        actual = Util.sanitize_html(sample)
+        if expected != actual:
+            raise AssertionError(
+                f"Output mismatch for {sample!r}:\n"
+                f"  expected {expected!r}\n  actual   {actual!r}"
+            )
+    return len(samples)
+
+
+def main():
+    count = check_golden()
+    print(f"{count} samples produce identical output")
+
+    for paragraphs in (1, 10, 100):
+        text = review_markup(paragraphs)
+        number = max(10, 2000 // paragraphs)
+        old = timeit.timeit(lambda: sanitize_html_bs4(text), number=number)
+        new = timeit.timeit(lambda: Util.sanitize_html(text), number=number)
+        print(
+            f"{len(text):>7} chars: bs4 {old / number * 1e6:9.1f} µs, "
+            f"streaming {new / number * 1e6:9.1f} µs ({old / new:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Runs several notifier lease holders against one database.
+
+Every worker process refreshes its ShardLeaseManager in a loop, like
+notify() does for each follow, and reports the shards it holds. The
+script checks that every shard ends up held by exactly one worker, prints
+how they are spread, and checks that the shards of a killed worker are
+taken over once its leases expired.
+
+    python -m benchmarks.shard_leases [--workers 3] [--shards 16]
+        [--lease 2] [--database sqlite:///shards.db]
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+from datetime import timedelta
+
+from sqlalchemy import create_engine
+
+from letterboxd_followbot.database.lease import ShardLeaseManager
+from letterboxd_followbot.database.model import Base
+
+
+def worker(database: str, shards: int, lease: float, name: str, queue) -> None:
+    manager = ShardLeaseManager(
+        create_engine(database),
+        shards,
+        owner=name,
+        lease_duration=timedelta(seconds=lease),
+    )
+    while True:
+        queue.put((name, sorted(manager.refresh())))
+        time.sleep(lease / 3)
+
+
+def collect(
+    queue, seconds: float, workers: set[str], shard_count: int
+) -> dict[str, list[int]]:
+    """Returns the last shards reported by each worker after seconds, and
+    checks that together they hold every shard exactly once."""
+    held = {}
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        name, shards = queue.get(timeout=seconds)
+        if name in workers:
+            held[name] = shards
+
+    for name, shards in sorted(held.items()):
+        print(f"  {name}: {shards}")
+    if sorted(shard for shards in held.values() for shard in shards) != list(
+        range(shard_count)
+    ):
+        raise AssertionError("Shards are not held exactly once")
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--lease", type=float, default=2, metavar="SECONDS")
+    parser.add_argument("--database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = args.database or f"sqlite:///{directory}/shards.db"
+        Base.metadata.create_all(create_engine(database))
+
+        queue = multiprocessing.Queue()
+        processes = {}
+        for n in range(args.workers):
+            name = f"worker{n}"
+            processes[name] = multiprocessing.Process(
+                target=worker,
+                args=(database, args.shards, args.lease, name, queue),
+                daemon=True,
+            )
+            processes[name].start()
+
+        print(f"{args.workers} workers after {args.lease * 4:.0f} s:")
+        held = collect(queue, args.lease * 4, set(processes), args.shards)
+
+        killed = sorted(processes)[0]
+        processes.pop(killed).kill()
+        print(f"Killed {killed} holding {held[killed]}, after {args.lease * 4:.0f} s:")
+        collect(queue, args.lease * 4, set(processes), args.shards)
+
+        for process in processes.values():
+            process.kill()
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
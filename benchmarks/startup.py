@@ -0,0 +1,133 @@
+"""Startup time of the entry points and cost of their first request.
+
+Every module is imported in a fresh interpreter, in an empty working
+directory and with a DATABASE_URL that can't be opened, so an import that
+connects to the database, reaches the network or creates files fails or
+shows up. The script checks that the import left the working directory
+empty and created none of the app_context resources.
+
+The first request is then timed in this process: the first database query
+through app_context (creating the engine and running the migrations),
+building the Telegram application, and the first Letterboxd request, which
+has to fetch the access token, compared to a second one. Letterboxd is an httpx
+MockTransport that can add a fixed latency per call.
+
+    python -m benchmarks.startup [--modules bot notify run] [--repeat 5]
+        [--letterboxd-latency 0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from benchmarks.notify_throughput import BASE_URL, FakeLetterboxd
+from letterboxd_followbot.config import Config
+from letterboxd_followbot.context import app_context
+from letterboxd_followbot.database.model import FollowMember
+from letterboxd_followbot.letterboxd.api import LetterboxdClient
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+from letterboxd_followbot.context import app_context
+print(json.dumps({{"seconds": seconds, "created": sorted(vars(app_context))}}))
+"""
+
+
+def time_import(module: str) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(ROOT),
+            TELEGRAM_TOKEN="0:startup",
+            DATABASE_URL=f"sqlite:///{directory}/missing/startup.db",
+        )
+        result = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", IMPORT_SCRIPT.format(module=module)],
+            cwd=directory,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        output = json.loads(result.stdout.splitlines()[-1])
+        if output["created"]:
+            raise AssertionError(f"import {module} created {output['created']}")
+        if os.listdir(directory):
+            raise AssertionError(f"import {module} wrote {os.listdir(directory)}")
+    return output["seconds"]
+
+
+def timed(func) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def first_request(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["TELEGRAM_TOKEN"] = "0:startup"
+        os.environ.setdefault("LETTERBOXD_CLIENT_ID", "id")
+        os.environ.setdefault("LETTERBOXD_CLIENT_SECRET", "secret")
+        os.environ["DATABASE_URL"] = f"sqlite:///{directory}/startup.db"
+        Config.load()
+
+        def query():
+            with Session(app_context.engine) as session:
+                return session.scalars(select(FollowMember)).all()
+
+        first, _ = timed(query)
+        second, _ = timed(query)
+        print(
+            f"  {'database query':<20} first {first * 1000:8.2f} ms  "
+            f"then {second * 1000:8.2f} ms"
+        )
+
+        seconds, _ = timed(lambda: app_context.application)
+        print(f"  {'telegram application':<20} first {seconds * 1000:8.2f} ms")
+
+        letterboxd = FakeLetterboxd(0, args.letterboxd_latency / 1000)
+        app_context.letterboxd_client = LetterboxdClient(
+            "id", "secret", base_url=BASE_URL, transport=letterboxd.transport()
+        )
+        first, _ = timed(lambda: app_context.letterboxd_client.get_member("m0"))
+        second, _ = timed(lambda: app_context.letterboxd_client.get_member("m1"))
+        print(
+            f"  {'letterboxd request':<20} first {first * 1000:8.2f} ms  "
+            f"then {second * 1000:8.2f} ms  ({letterboxd.calls['auth']} token)"
+        )
+
+        app_context.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--modules", nargs="+", default=["bot", "notify", "run"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--letterboxd-latency", type=float, default=0, metavar="MS")
+    args = parser.parse_args()
+
+    print(f"Import in a fresh interpreter, median of {args.repeat}:")
+    for module in args.modules:
+        seconds = [time_import(module) for _ in range(args.repeat)]
+        print(f"  {module:<20} {statistics.median(seconds) * 1000:8.1f} ms")
+
+    print("First request:")
+    first_request(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-import os
+import asyncio
+from datetime import datetime, timezone
+from urllib.parse import urlparse
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 from telegram import (
     Update,
@@ -10,45 +11,35 @@ from telegram import (
     ReplyKeyboardMarkup,
 )
 from telegram.ext import (
-    ApplicationBuilder,
     CommandHandler,
     ContextTypes,
     ConversationHandler,
     MessageHandler,
     filters,
 )
-import dotenv
 
 from letterboxd_followbot.database.model import (
-    Base,
     User,
     Chat,
     FollowMember,
     FollowMemberType,
 )
-from letterboxd_followbot.letterboxd.api import LetterboxdClient
+from letterboxd_followbot.config import Config
+from letterboxd_followbot.context import app_context
+from letterboxd_followbot.letterboxd.scheduler import RequestPriority, prioritized
+from letterboxd_followbot.telegram.persistence import SharedConversationHandler
 import logging
 
-engine = create_engine("sqlite:///data/local.db")
-
-Base.metadata.create_all(engine)
-
-dotenv.load_dotenv()
-
-TG_TOKEN = os.environ.get("TELEGRAM_TOKEN")
-app = ApplicationBuilder().token(TG_TOKEN).build()
-
-LETTERBOXD_CLIENT_ID = os.environ.get("LETTERBOXD_CLIENT_ID")
-LETTERBOXD_CLIENT_SECRET = os.environ.get("LETTERBOXD_CLIENT_SECRET")
-letterboxd_client = LetterboxdClient(LETTERBOXD_CLIENT_ID, LETTERBOXD_CLIENT_SECRET)
-
 FOLLOW_STATE_SEARCH_MEMBER, FOLLOW_STATE_CONFIRM = range(2)
 
+# All handlers react to messages, so no other update types are requested
+ALLOWED_UPDATES = [Update.MESSAGE]
+
 
 def create_or_update_user(telegram_user: TelegramUser):
     user_id = telegram_user.id
 
-    with Session(engine) as session:
+    with Session(app_context.engine) as session:
         user = session.get(User, user_id)
 
         if user is None:
@@ -67,7 +58,7 @@ def create_or_update_user(telegram_user: TelegramUser):
 def create_or_update_chat(telegram_chat: TelegramChat):
     chat_id = telegram_chat.id
 
-    with Session(engine) as session:
+    with Session(app_context.engine) as session:
         chat = session.get(Chat, chat_id)
 
         if chat is None:
@@ -88,6 +79,7 @@ async def follow_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
     user = create_or_update_user(update.effective_user)
     chat = create_or_update_chat(update.effective_chat)
+    context.user_data["follow_type"] = FollowMemberType.MEMBER
 
     await update.message.reply_text(
         f"Please enter name of the member or a link to the member you want to follow. Send /cancel to stop.",
@@ -97,12 +89,35 @@ async def follow_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return FOLLOW_STATE_SEARCH_MEMBER
 
 
+async def follow_network_start(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+
+    user = create_or_update_user(update.effective_user)
+    chat = create_or_update_chat(update.effective_chat)
+    context.user_data["follow_type"] = FollowMemberType.FOLLOWING
+
+    await update.message.reply_text(
+        f"Please enter name of the member or a link to the member whose followed members you want to follow. Send /cancel to stop.",
+        reply_markup=ForceReply(selective=True),
+    )
+
+    return FOLLOW_STATE_SEARCH_MEMBER
+
+
+@prioritized(RequestPriority.INTERACTIVE)
 async def follow_search_member(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     member_name = update.message.text
 
-    results = letterboxd_client.search(member_name, include=["MemberSearchItem"])
+    # in a thread, so waiting for Letterboxd doesn't hold up the event loop
+    # the notifier jobs share with the bot when started through run.py
+    results = await asyncio.to_thread(
+        app_context.letterboxd_client.search,
+        member_name,
+        include=["MemberSearchItem"],
+    )
 
     member_count = len(results["items"])
     if member_count == 0:
@@ -125,18 +140,28 @@ async def follow_search_member(
 
     member = results["items"][0]["member"]
 
-    biggest_avatar = len(member["avatar"]["sizes"]) - 1
-    avatar_url = member["avatar"]["sizes"][biggest_avatar]["url"]
-    caption = f"Follow {member['displayName']} ({member['username']})?"
+    avatar_url = app_context.poster_selector.select_image_url(member["avatar"])
+    if context.user_data.get("follow_type") == FollowMemberType.FOLLOWING:
+        caption = (
+            f"Follow everyone {member['displayName']} ({member['username']}) follows?"
+        )
+    else:
+        caption = f"Follow {member['displayName']} ({member['username']})?"
     context.user_data["member_id"] = member["id"]
 
     reply_keyboard = ReplyKeyboardMarkup(
         [["Yes", "No"]], one_time_keyboard=True, selective=True
     )
 
-    await update.message.reply_photo(
-        avatar_url, caption=caption, reply_markup=reply_keyboard
-    )
+    if avatar_url is None:
+        await update.message.reply_text(caption, reply_markup=reply_keyboard)
+    else:
+        await app_context.file_cache.send_photo(
+            avatar_url,
+            lambda photo: update.message.reply_photo(
+                photo, caption=caption, reply_markup=reply_keyboard
+            ),
+        )
 
     return FOLLOW_STATE_CONFIRM
 
@@ -149,15 +174,34 @@ async def follow_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Okay, please search again")
         return FOLLOW_STATE_SEARCH_MEMBER
 
-    await update.message.reply_text(f"Following member with id {member_id}")
+    follow_type = context.user_data.get("follow_type", FollowMemberType.MEMBER)
+    if follow_type == FollowMemberType.FOLLOWING:
+        await update.message.reply_text(
+            f"Following everyone the member with id {member_id} follows"
+        )
+    else:
+        await update.message.reply_text(f"Following member with id {member_id}")
 
-    with Session(engine) as session:
+    with Session(app_context.engine) as session:
         chat_id = update.effective_chat.id
 
-        follow_member = FollowMember(
-            chat_id=chat_id, member_id=member_id, type=FollowMemberType.MEMBER
+        follow_member = (
+            session.query(FollowMember)
+            .filter_by(chat_id=chat_id, member_id=member_id, type=follow_type)
+            .first()
         )
-        session.add(follow_member)
+        if follow_member is None:
+            follow_member = FollowMember(
+                chat_id=chat_id, member_id=member_id, type=follow_type
+            )
+            session.add(follow_member)
+        else:
+            # following a quarantined member again starts over from now
+            if follow_member.quarantined_at is not None:
+                follow_member.last_checked_at = datetime.now(timezone.utc)
+            follow_member.failure_count = 0
+            follow_member.next_attempt_at = None
+            follow_member.quarantined_at = None
 
         session.commit()
 
@@ -171,7 +215,7 @@ async def follow_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
 
 async def unfollow_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    with Session(engine) as session:
+    with Session(app_context.engine) as session:
         chat_id = update.effective_chat.id
 
         follow_members = session.query(FollowMember).filter_by(chat_id=chat_id).all()
@@ -184,15 +228,15 @@ async def unfollow_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text("Unfollowed all members")
 
 
-def main():
-    logging.basicConfig(level=logging.INFO)
-    logging.getLogger("httpx").setLevel(logging.WARNING)
-
-    # results = letterboxd_client.search("jantast", include=["MemberSearchItem"])
-    # print(results)
-
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("follow", follow_start)],
+def add_handlers():
+    # the state is kept in the database, so every instance can continue it
+    conv_handler = SharedConversationHandler(
+        app_context.persistence,
+        name="follow",
+        entry_points=[
+            CommandHandler("follow", follow_start),
+            CommandHandler("follownetwork", follow_network_start),
+        ],
         states={
             FOLLOW_STATE_SEARCH_MEMBER: [
                 MessageHandler(filters.Regex("^(.*)$"), follow_search_member)
@@ -213,14 +257,51 @@ def main():
         fallbacks=[CommandHandler("cancel", follow_cancel)],
     )
     unfollow = CommandHandler("unfollowall", unfollow_all)
-    app.add_handler(unfollow)
-    app.add_handler(conv_handler)
+    app_context.application.add_handler(unfollow)
+    app_context.application.add_handler(conv_handler)
+
+
+def webhook_options() -> dict:
+    webhook_url = Config.TELEGRAM_WEBHOOK_URL
+    return {
+        "listen": Config.TELEGRAM_WEBHOOK_LISTEN,
+        "port": Config.TELEGRAM_WEBHOOK_PORT,
+        "url_path": urlparse(webhook_url).path.lstrip("/"),
+        "webhook_url": webhook_url,
+        "secret_token": Config.TELEGRAM_WEBHOOK_SECRET,
+        "allowed_updates": ALLOWED_UPDATES,
+    }
+
+
+async def start_updater():
+    """Starts receiving updates on an initialized and started app, for
+    running the bot on an event loop shared with other jobs."""
+    if Config.TELEGRAM_WEBHOOK_URL is None:
+        logging.info("Starting bot")
+        await app_context.application.updater.start_polling(
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        logging.info(f"Starting bot with webhook {Config.TELEGRAM_WEBHOOK_URL}")
+        await app_context.application.updater.start_webhook(**webhook_options())
 
-    logging.info("Starting bot")
 
-    
+def main():
+    Config.load()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # results = app_context.letterboxd_client.search("jantast", include=["MemberSearchItem"])
+    # print(results)
+
+    add_handlers()
 
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if Config.TELEGRAM_WEBHOOK_URL is None:
+        logging.info("Starting bot")
+        app_context.application.run_polling(allowed_updates=ALLOWED_UPDATES)
+    else:
+        logging.info(f"Starting bot with webhook {Config.TELEGRAM_WEBHOOK_URL}")
+        app_context.application.run_webhook(**webhook_options())
 
 if __name__ == "__main__":
     main()
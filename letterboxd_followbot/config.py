@@ -5,18 +5,51 @@ import dotenv
 
 
 class Config:
+    DATABASE_URL = "sqlite:///data/local.db"
+    DATABASE_POOL_SIZE = 5
+    DATABASE_MAX_OVERFLOW = 10
     TELEGRAM_TOKEN = None
+    TELEGRAM_WEBHOOK_URL = None
+    TELEGRAM_WEBHOOK_SECRET = None
+    TELEGRAM_WEBHOOK_LISTEN = "0.0.0.0"
+    TELEGRAM_WEBHOOK_PORT = 8080
     LETTERBOXD_CLIENT_ID = None
     LETTERBOXD_CLIENT_SECRET = None
+    LETTERBOXD_MAX_CONCURRENT_REQUESTS = 4
+    LETTERBOXD_RESERVED_INTERACTIVE = 1
+    POSTER_TARGET_WIDTH = 600
+    POSTER_TARGET_HEIGHT = 900
+    MEDIA_GROUP_THRESHOLD = 4
+    SHOWTIME_CINEMAS = []
+    METRICS_PORT = None
+    METRICS_HOST = "127.0.0.1"
+    TRACE_OUTPUT = None
+    NOTIFY_SHARDS = 0
+    NOTIFY_LEASE_SECONDS = 300
+    NOTIFY_FAILURE_LIMIT = 5
+    NOTIFY_BACKOFF_SECONDS = 600
+    FILM_STATISTICS_MAX_AGE_SECONDS = 6 * 60 * 60
 
     @classmethod
     def load(cls):
         dotenv.load_dotenv()
 
+        cls.load_database()
+
         cls.TELEGRAM_TOKEN = environ.get("TELEGRAM_TOKEN")
         if cls.TELEGRAM_TOKEN is None:
             raise ValueError("TELEGRAM_TOKEN is not set")
 
+        # Public url Telegram posts updates to. The bot long polls without it
+        cls.TELEGRAM_WEBHOOK_URL = environ.get("TELEGRAM_WEBHOOK_URL")
+        cls.TELEGRAM_WEBHOOK_SECRET = environ.get("TELEGRAM_WEBHOOK_SECRET")
+        cls.TELEGRAM_WEBHOOK_LISTEN = environ.get(
+            "TELEGRAM_WEBHOOK_LISTEN", cls.TELEGRAM_WEBHOOK_LISTEN
+        )
+        cls.TELEGRAM_WEBHOOK_PORT = int(
+            environ.get("TELEGRAM_WEBHOOK_PORT", cls.TELEGRAM_WEBHOOK_PORT)
+        )
+
         cls.LETTERBOXD_CLIENT_ID = environ.get("LETTERBOXD_CLIENT_ID")
         if cls.LETTERBOXD_CLIENT_ID is None:
             raise ValueError("LETTERBOXD_CLIENT_ID is not set")
@@ -24,3 +57,75 @@ class Config:
         cls.LETTERBOXD_CLIENT_SECRET = environ.get("LETTERBOXD_CLIENT_SECRET")
         if cls.LETTERBOXD_CLIENT_SECRET is None:
             raise ValueError("LETTERBOXD_CLIENT_SECRET is not set")
+
+        # Requests in flight at once, the last slots kept for bot searches
+        cls.LETTERBOXD_MAX_CONCURRENT_REQUESTS = int(
+            environ.get(
+                "LETTERBOXD_MAX_CONCURRENT_REQUESTS",
+                cls.LETTERBOXD_MAX_CONCURRENT_REQUESTS,
+            )
+        )
+        cls.LETTERBOXD_RESERVED_INTERACTIVE = int(
+            environ.get(
+                "LETTERBOXD_RESERVED_INTERACTIVE", cls.LETTERBOXD_RESERVED_INTERACTIVE
+            )
+        )
+
+        cls.POSTER_TARGET_WIDTH = int(
+            environ.get("POSTER_TARGET_WIDTH", cls.POSTER_TARGET_WIDTH)
+        )
+        cls.POSTER_TARGET_HEIGHT = int(
+            environ.get("POSTER_TARGET_HEIGHT", cls.POSTER_TARGET_HEIGHT)
+        )
+
+        cls.MEDIA_GROUP_THRESHOLD = int(
+            environ.get("MEDIA_GROUP_THRESHOLD", cls.MEDIA_GROUP_THRESHOLD)
+        )
+
+        # Comma separated kino.de cinemas as city/cinema, e.g. koblenz/apollo-koblenz
+        cls.SHOWTIME_CINEMAS = [
+            tuple(cinema.strip().split("/", 1))
+            for cinema in environ.get("SHOWTIME_CINEMAS", "").split(",")
+            if "/" in cinema
+        ]
+
+        metrics_port = environ.get("METRICS_PORT")
+        cls.METRICS_PORT = int(metrics_port) if metrics_port else None
+        cls.METRICS_HOST = environ.get("METRICS_HOST", cls.METRICS_HOST)
+
+        # "log" or the path of a JSONL file to write per cycle timings to
+        cls.TRACE_OUTPUT = environ.get("TRACE_OUTPUT", cls.TRACE_OUTPUT)
+
+        # With shards, notifier instances split the follows through leases
+        cls.NOTIFY_SHARDS = int(environ.get("NOTIFY_SHARDS", cls.NOTIFY_SHARDS))
+        cls.NOTIFY_LEASE_SECONDS = int(
+            environ.get("NOTIFY_LEASE_SECONDS", cls.NOTIFY_LEASE_SECONDS)
+        )
+
+        # A follow failing this often in a row is quarantined. Before that,
+        # the wait between polls doubles from NOTIFY_BACKOFF_SECONDS
+        cls.NOTIFY_FAILURE_LIMIT = int(
+            environ.get("NOTIFY_FAILURE_LIMIT", cls.NOTIFY_FAILURE_LIMIT)
+        )
+        cls.NOTIFY_BACKOFF_SECONDS = int(
+            environ.get("NOTIFY_BACKOFF_SECONDS", cls.NOTIFY_BACKOFF_SECONDS)
+        )
+
+        # Film statistics are shown from the film table until this old
+        cls.FILM_STATISTICS_MAX_AGE_SECONDS = int(
+            environ.get(
+                "FILM_STATISTICS_MAX_AGE_SECONDS", cls.FILM_STATISTICS_MAX_AGE_SECONDS
+            )
+        )
+
+    @classmethod
+    def load_database(cls):
+        """Loads only the database settings, for alembic/env.py, which runs
+        the migrations without the rest of the config being set."""
+        cls.DATABASE_URL = environ.get("DATABASE_URL", cls.DATABASE_URL)
+        cls.DATABASE_POOL_SIZE = int(
+            environ.get("DATABASE_POOL_SIZE", cls.DATABASE_POOL_SIZE)
+        )
+        cls.DATABASE_MAX_OVERFLOW = int(
+            environ.get("DATABASE_MAX_OVERFLOW", cls.DATABASE_MAX_OVERFLOW)
+        )
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from functools import cached_property
+
+from sqlalchemy import Engine
+from telegram.ext import Application, ApplicationBuilder, ExtBot
+
+from letterboxd_followbot.config import Config
+from letterboxd_followbot.database.engine import (
+    create_engine_from_config,
+    upgrade_database,
+)
+from letterboxd_followbot.letterboxd.api import LetterboxdClient
+from letterboxd_followbot.letterboxd.film import FilmStore
+from letterboxd_followbot.telegram.file_cache import FileIdCache
+from letterboxd_followbot.telegram.persistence import DatabasePersistence
+from letterboxd_followbot.telegram.poster import PosterSelector
+
+
+class AppContext:
+    """Creates the resources of the entry points on first use.
+
+    Importing a module or creating the context does no I/O: the engine is
+    created (and the database migrated to the latest revision) when it is
+    first used, and the Letterboxd client only fetches its token with its
+    first request. Config has to be loaded before. All modules share
+    app_context, so the bot and the notifier jobs use the same resources in
+    one process.
+    """
+
+    @cached_property
+    def engine(self) -> Engine:
+        engine = create_engine_from_config()
+        upgrade_database(engine)
+        return engine
+
+    @cached_property
+    def persistence(self) -> DatabasePersistence:
+        return DatabasePersistence(self.engine)
+
+    @cached_property
+    def application(self) -> Application:
+        return (
+            ApplicationBuilder()
+            .token(Config.TELEGRAM_TOKEN)
+            .persistence(self.persistence)
+            .build()
+        )
+
+    @property
+    def bot(self) -> ExtBot:
+        return self.application.bot
+
+    @cached_property
+    def film_store(self) -> FilmStore:
+        return FilmStore(
+            self.engine,
+            timedelta(seconds=Config.FILM_STATISTICS_MAX_AGE_SECONDS),
+        )
+
+    @cached_property
+    def letterboxd_client(self) -> LetterboxdClient:
+        return LetterboxdClient.from_config(self.film_store)
+
+    @cached_property
+    def file_cache(self) -> FileIdCache:
+        return FileIdCache(self.engine)
+
+    @cached_property
+    def poster_selector(self) -> PosterSelector:
+        return PosterSelector.from_config()
+
+
+app_context = AppContext()
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import Engine, create_engine, inspect, text
+from sqlalchemy.engine import make_url
+
+from letterboxd_followbot.config import Config
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+# any constant works, instances only have to agree on it
+MIGRATION_LOCK_KEY = 0x6C62_6662
+# the schema before the migrations were added
+BASELINE_REVISION = "0deb28ba2f31"
+
+
+def create_engine_from_config() -> Engine:
+    """Creates the engine for DATABASE_URL.
+
+    SQLite keeps SQLAlchemy's defaults. Server databases such as Postgres
+    (postgresql+psycopg://...) get a connection pool sized by
+    DATABASE_POOL_SIZE and DATABASE_MAX_OVERFLOW, whose connections are
+    checked before use, since several processes share them.
+    """
+    url = make_url(Config.DATABASE_URL)
+    if url.get_dialect().is_async:
+        raise ValueError(
+            f"DATABASE_URL uses the async driver {url.drivername}, "
+            "use a sync driver like postgresql+psycopg instead"
+        )
+
+    if url.get_backend_name() == "sqlite":
+        return create_engine(url)
+
+    return create_engine(
+        url,
+        pool_size=Config.DATABASE_POOL_SIZE,
+        max_overflow=Config.DATABASE_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=30 * 60,
+    )
+
+
+def upgrade_database(engine: Engine) -> None:
+    """Runs the Alembic migrations up to head, like `alembic upgrade head`.
+
+    A database created before the migrations were added has the tables of
+    BASELINE_REVISION but no alembic_version, it is stamped with that
+    revision first. On Postgres the migrations run under an advisory lock,
+    so instances starting at the same time migrate one after the other.
+    """
+    alembic_config = AlembicConfig(str(ROOT / "alembic.ini"))
+    alembic_config.set_main_option("script_location", str(ROOT / "alembic"))
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": MIGRATION_LOCK_KEY},
+            )
+        alembic_config.attributes["connection"] = connection
+        tables = inspect(connection).get_table_names()
+        if "alembic_version" not in tables and "chat" in tables:
+            command.stamp(alembic_config, BASELINE_REVISION)
+        command.upgrade(alembic_config, "head")
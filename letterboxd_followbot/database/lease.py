@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Engine, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from letterboxd_followbot.database.model import NotifierInstance, NotifierShardLease
+
+
+class ShardLeaseManager:
+    """Splits the follows between notifier processes sharing one database.
+
+    Follows are grouped into shard_count shards by FollowMember.id. Every
+    instance keeps a heartbeat row and holds the shards it works on through
+    lease rows with an owner and an expiry. On refresh it renews its leases,
+    gives back shards above its fair share of the live instances and claims
+    free or expired ones, so shards of a crashed instance are taken over
+    once their lease ran out.
+
+    Jobs that only one instance may run are assigned to the owner of the
+    shard their name hashes to, see owns_job().
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        shard_count: int,
+        owner: str = None,
+        lease_duration: timedelta = timedelta(minutes=5),
+    ) -> None:
+        if owner is None:
+            owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.engine = engine
+        self.shard_count = shard_count
+        self.owner = owner
+        self.lease_duration = lease_duration
+        self.shards: set[int] = set()
+        self.logger = logging.getLogger(__name__)
+        self.__refreshed_at = None
+
+    def owns(self, follow_member_id: int) -> bool:
+        """Whether this instance should poll the follow, refreshing the
+        leases first when a third of the lease duration has passed. Nothing
+        is owned while the leases may have run out."""
+        lease_seconds = self.lease_duration.total_seconds()
+        if self.__refreshed_at is None or self.__since_refresh() >= lease_seconds / 3:
+            try:
+                self.refresh()
+            except Exception:
+                self.logger.exception("Failed to refresh shard leases")
+
+        if self.__refreshed_at is None or self.__since_refresh() >= lease_seconds:
+            return False
+        return follow_member_id % self.shard_count in self.shards
+
+    def owns_job(self, job: str) -> bool:
+        """Whether this instance should run a job that only one instance
+        may run."""
+        return self.owns(zlib.crc32(job.encode()))
+
+    async def keep_renewed(self) -> None:
+        """Refreshes the leases every third of the lease duration, so they
+        stay held while the jobs send messages or sleep."""
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                self.logger.exception("Failed to refresh shard leases")
+            await asyncio.sleep(self.lease_duration.total_seconds() / 3)
+
+    def refresh(self) -> set[int]:
+        now = datetime.now(timezone.utc)
+        expires_at = now + self.lease_duration
+
+        with Session(self.engine) as session:
+            session.merge(NotifierInstance(owner=self.owner, expires_at=expires_at))
+            instances = len(
+                session.scalars(
+                    select(NotifierInstance.owner).where(
+                        NotifierInstance.expires_at > now
+                    )
+                ).all()
+            )
+            fair_share = math.ceil(self.shard_count / max(instances, 1))
+
+            session.execute(
+                update(NotifierShardLease)
+                .where(NotifierShardLease.owner == self.owner)
+                .values(expires_at=expires_at)
+            )
+            owners = dict(
+                session.execute(
+                    select(NotifierShardLease.shard, NotifierShardLease.owner)
+                ).all()
+            )
+            session.commit()
+
+            shards = sorted(
+                shard
+                for shard, owner in owners.items()
+                if owner == self.owner and shard < self.shard_count
+            )
+            if len(shards) > fair_share:
+                self.__release(session, shards[fair_share:])
+                shards = shards[:fair_share]
+
+            for shard in range(self.shard_count):
+                if len(shards) >= fair_share:
+                    break
+                if shard not in owners:
+                    claimed = self.__claim_free(session, shard, expires_at)
+                elif owners[shard] != self.owner:
+                    claimed = self.__claim_expired(session, shard, now, expires_at)
+                else:
+                    continue
+                if claimed:
+                    shards.append(shard)
+
+        if set(shards) != self.shards:
+            self.logger.info(
+                f"Holding shards {sorted(shards)} of {self.shard_count} "
+                f"({instances} notifier instances)"
+            )
+        self.shards = set(shards)
+        self.__refreshed_at = time.monotonic()
+        return self.shards
+
+    def release(self) -> None:
+        with Session(self.engine) as session:
+            self.__release(session, list(self.shards))
+            session.execute(
+                delete(NotifierInstance).where(NotifierInstance.owner == self.owner)
+            )
+            session.commit()
+        self.shards = set()
+        self.__refreshed_at = None
+
+    def __since_refresh(self) -> float:
+        return time.monotonic() - self.__refreshed_at
+
+    def __claim_free(self, session: Session, shard: int, expires_at: datetime) -> bool:
+        try:
+            session.add(
+                NotifierShardLease(shard=shard, owner=self.owner, expires_at=expires_at)
+            )
+            session.commit()
+            return True
+        except IntegrityError:
+            # another instance inserted the lease first
+            session.rollback()
+            return False
+
+    def __claim_expired(
+        self, session: Session, shard: int, now: datetime, expires_at: datetime
+    ) -> bool:
+        result = session.execute(
+            update(NotifierShardLease)
+            .where(
+                NotifierShardLease.shard == shard,
+                NotifierShardLease.expires_at <= now,
+            )
+            .values(owner=self.owner, expires_at=expires_at)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    def __release(self, session: Session, shards: list[int]) -> None:
+        session.execute(
+            delete(NotifierShardLease).where(
+                NotifierShardLease.shard.in_(shards),
+                NotifierShardLease.owner == self.owner,
+            )
+        )
+        session.commit()
@@ -1,9 +1,10 @@
 import enum
+from typing import Any
 from typing import List
 from typing import Optional
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import JSON, BigInteger, ForeignKey, DateTime, PickleType
 from sqlalchemy import String
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
@@ -18,7 +19,7 @@ class Base(DeclarativeBase):
 
 class User(Base):
     __tablename__ = "user"
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     first_name: Mapped[str]
     last_name: Mapped[str]
     username: Mapped[Optional[str]]
@@ -30,7 +31,7 @@ class User(Base):
 
 class Chat(Base):
     __tablename__ = "chat"
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     title: Mapped[str]
     type: Mapped[str]
 
@@ -46,12 +47,16 @@ class FollowMemberType(enum.Enum):
 class FollowMember(Base):
     __tablename__ = "follow_member"
     id: Mapped[int] = mapped_column(primary_key=True)
-    chat_id: Mapped[int] = mapped_column(ForeignKey("chat.id"))
-    member_id: Mapped[int]
+    chat_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("chat.id"))
+    member_id: Mapped[str]
     type: Mapped[FollowMemberType]
     last_checked_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    # consecutive failed polls, which delay the next one until next_attempt_at
+    failure_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    quarantined_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
 
     def __repr__(self) -> str:
         return f"FollowMember(id={self.id!r}, chat_id={self.chat_id!r}, member_id={self.member_id!r}, type={self.type!r})"
@@ -60,10 +65,135 @@ class FollowMember(Base):
 class PopularTodo(Base):
     __tablename__ = "popular_todo"
     id: Mapped[int] = mapped_column(primary_key=True)
-    chat_id: Mapped[int] = mapped_column(ForeignKey("chat.id"))
-    member_id: Mapped[int]
+    chat_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("chat.id"))
+    member_id: Mapped[str]
     next_rank: Mapped[int] = mapped_column(nullable=True)
     next_film_id: Mapped[str] = mapped_column(nullable=True)
 
     def __repr__(self) -> str:
         return f"PopularTodo(id={self.id!r}, chat_id={self.chat_id!r}, next_rank={self.next_rank!r}, next_film_id={self.next_film_id!r})"
+
+
+class TelegramFile(Base):
+    __tablename__ = "telegram_file"
+    url: Mapped[str] = mapped_column(primary_key=True)
+    file_id: Mapped[str]
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"TelegramFile(url={self.url!r}, file_id={self.file_id!r})"
+
+
+class ImdbFilm(Base):
+    __tablename__ = "imdb_film"
+    imdb_id: Mapped[str] = mapped_column(primary_key=True)
+    film_id: Mapped[Optional[str]]
+    film_name: Mapped[Optional[str]]
+    resolved_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"ImdbFilm(imdb_id={self.imdb_id!r}, film_id={self.film_id!r}, film_name={self.film_name!r})"
+
+
+class Film(Base):
+    __tablename__ = "film"
+    id: Mapped[str] = mapped_column(primary_key=True)
+    name: Mapped[str]
+    release_year: Mapped[Optional[int]]
+    rating: Mapped[Optional[float]]
+    letterboxd_url: Mapped[Optional[str]]
+    directors: Mapped[Optional[list]] = mapped_column(JSON)
+    poster_sizes: Mapped[Optional[list]] = mapped_column(JSON)
+    statistics: Mapped[Optional[dict]] = mapped_column(JSON)
+    statistics_updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True)
+    )
+    seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"Film(id={self.id!r}, name={self.name!r}, release_year={self.release_year!r})"
+
+
+class WatchlistFilm(Base):
+    __tablename__ = "watchlist_film"
+    member_id: Mapped[str] = mapped_column(primary_key=True)
+    film_id: Mapped[str] = mapped_column(primary_key=True)
+
+    def __repr__(self) -> str:
+        return f"WatchlistFilm(member_id={self.member_id!r}, film_id={self.film_id!r})"
+
+
+class WatchlistSync(Base):
+    __tablename__ = "watchlist_sync"
+    member_id: Mapped[str] = mapped_column(primary_key=True)
+    synced_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return (
+            f"WatchlistSync(member_id={self.member_id!r}, synced_at={self.synced_at!r})"
+        )
+
+
+class CinemaProgram(Base):
+    __tablename__ = "cinema_program"
+    city: Mapped[str] = mapped_column(primary_key=True)
+    cinema: Mapped[str] = mapped_column(primary_key=True)
+    etag: Mapped[Optional[str]]
+    last_modified: Mapped[Optional[str]]
+    content_hash: Mapped[str]
+    checked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"CinemaProgram(city={self.city!r}, cinema={self.cinema!r}, content_hash={self.content_hash!r})"
+
+
+class ShowtimeNotification(Base):
+    __tablename__ = "showtime_notification"
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    member_id: Mapped[str] = mapped_column(primary_key=True)
+    film_id: Mapped[str] = mapped_column(primary_key=True)
+    notified_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"ShowtimeNotification(chat_id={self.chat_id!r}, member_id={self.member_id!r}, film_id={self.film_id!r})"
+
+
+class ConversationState(Base):
+    __tablename__ = "conversation_state"
+    name: Mapped[str] = mapped_column(primary_key=True)
+    # the conversation key, e.g. (chat id, user id), as a JSON list
+    key: Mapped[str] = mapped_column(primary_key=True)
+    state: Mapped[Any] = mapped_column(PickleType)
+
+    def __repr__(self) -> str:
+        return f"ConversationState(name={self.name!r}, key={self.key!r}, state={self.state!r})"
+
+
+class TelegramUserData(Base):
+    __tablename__ = "telegram_user_data"
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    data: Mapped[dict] = mapped_column(PickleType)
+
+    def __repr__(self) -> str:
+        return f"TelegramUserData(user_id={self.user_id!r}, data={self.data!r})"
+
+
+class NotifierInstance(Base):
+    __tablename__ = "notifier_instance"
+    owner: Mapped[str] = mapped_column(primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"NotifierInstance(owner={self.owner!r}, expires_at={self.expires_at!r})"
+
+
+class NotifierShardLease(Base):
+    __tablename__ = "notifier_shard_lease"
+    shard: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    owner: Mapped[str]
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"NotifierShardLease(shard={self.shard!r}, owner={self.owner!r}, expires_at={self.expires_at!r})"
@@ -0,0 +1,429 @@
+import asyncio
+import bisect
+import hashlib
+import heapq
+import re
+import sys
+from datetime import date, datetime, timezone
+from urllib import parse as urlparse
+from zoneinfo import ZoneInfo
+
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import PageElement
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from letterboxd_followbot.database.model import CinemaProgram
+
+try:
+    import lxml  # noqa: F401
+
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+
+class KinoDeCinema:
+    __slots__ = ("name", "city", "display_name", "zoneinfo")
+
+    def __init__(
+        self,
+        name: str,
+        city: str,
+        display_name: str,
+        zoneinfo: ZoneInfo = None,
+    ):
+        self.name = name
+        self.city = city
+        self.display_name = display_name
+        self.zoneinfo = zoneinfo
+
+    def __repr__(self):
+        return f"KinoDeCinema(name='{self.name}', city='{self.city}', display_name='{self.display_name}')"
+
+
+class KinoDeFilmPlaytime:
+    __slots__ = ("cinema", "shop_url", "imdb_id", "showtime_ts")
+
+    def __init__(
+        self,
+        cinema: KinoDeCinema,
+        shop_url: str,
+        imdb_id: str,
+        showtime_ts: int,
+    ):
+        self.cinema = cinema
+        self.shop_url = shop_url
+        self.imdb_id = imdb_id
+        self.showtime_ts = showtime_ts
+
+    @property
+    def showtime(self) -> datetime:
+        return datetime.fromtimestamp(self.showtime_ts, tz=self.cinema.zoneinfo)
+
+    def __repr__(self):
+        return f"KinoDeFilmPlaytime(showtime={self.showtime}, cinema={self.cinema.display_name})"
+
+
+class KinoDeFilm:
+    __slots__ = ("title", "page_url", "poster_url", "playtimes", "imdb_id")
+
+    def __init__(
+        self,
+        title: str,
+        page_url: str,
+        poster_url: str,
+        imdb_id: str,
+        playtimes: list[KinoDeFilmPlaytime],
+    ):
+        self.title = title
+        self.page_url = page_url
+        self.poster_url = poster_url
+        self.playtimes = playtimes
+        self.imdb_id = imdb_id
+
+    def __repr__(self):
+        return f"KinoDeFilm(title='{self.title}'; imdb_id='{self.imdb_id}'; playtimes={len(self.playtimes)})"
+
+
+class KinoDeShowtimeIndex:
+    """Films keyed by IMDb id, with their playtimes kept sorted by showtime on
+    insert and indexed by cinema and by day, so range queries are bisect
+    lookups instead of full sorts."""
+
+    def __init__(self, films: list[KinoDeFilm] = []):
+        self.__films: dict[str, KinoDeFilm] = {}
+        self.__by_cinema: dict[tuple[str, str], list[KinoDeFilmPlaytime]] = {}
+        self.__by_day: dict[date, list[KinoDeFilmPlaytime]] = {}
+
+        for film in films:
+            self.add_film(film)
+
+    def add_film(self, film: KinoDeFilm) -> None:
+        if film.imdb_id not in self.__films:
+            self.__films[film.imdb_id] = KinoDeFilm(
+                title=film.title,
+                page_url=film.page_url,
+                poster_url=film.poster_url,
+                imdb_id=film.imdb_id,
+                playtimes=[],
+            )
+        indexed_film = self.__films[film.imdb_id]
+
+        for playtime in film.playtimes:
+            self.__insort(indexed_film.playtimes, playtime)
+            cinema_key = (playtime.cinema.city, playtime.cinema.name)
+            self.__insort(self.__by_cinema.setdefault(cinema_key, []), playtime)
+            day = playtime.showtime.date()
+            self.__insort(self.__by_day.setdefault(day, []), playtime)
+
+    def films(self) -> list[KinoDeFilm]:
+        return list(self.__films.values())
+
+    def get_film(self, imdb_id: str) -> KinoDeFilm | None:
+        return self.__films.get(imdb_id)
+
+    def playtimes_on(
+        self, day: date, cinemas: list[tuple[str, str]] = None
+    ) -> list[KinoDeFilmPlaytime]:
+        """Playtimes on the given day, optionally limited to (city, cinema)
+        pairs, sorted by showtime."""
+        if cinemas is None:
+            return list(self.__by_day.get(day, []))
+
+        day_slices = []
+        for cinema in cinemas:
+            playtimes = self.__by_cinema.get(cinema, [])
+            low = bisect.bisect_left(playtimes, day, key=lambda p: p.showtime.date())
+            high = bisect.bisect_right(
+                playtimes, day, lo=low, key=lambda p: p.showtime.date()
+            )
+            day_slices.append(playtimes[low:high])
+        return list(heapq.merge(*day_slices, key=lambda p: p.showtime_ts))
+
+    def playtimes_between(
+        self, start: datetime, end: datetime, cinema: tuple[str, str] = None
+    ) -> list[KinoDeFilmPlaytime]:
+        """Playtimes with start <= showtime < end, for all cinemas or a
+        single (city, cinema) pair, sorted by showtime."""
+        if cinema is None:
+            playtimes = []
+            for day in sorted(self.__by_day):
+                if start.date() <= day <= end.date():
+                    playtimes.extend(self.__slice(self.__by_day[day], start, end))
+            return playtimes
+        return self.__slice(self.__by_cinema.get(cinema, []), start, end)
+
+    @staticmethod
+    def __slice(
+        playtimes: list[KinoDeFilmPlaytime], start: datetime, end: datetime
+    ) -> list[KinoDeFilmPlaytime]:
+        start_ts = start.timestamp()
+        end_ts = end.timestamp()
+        low = bisect.bisect_left(playtimes, start_ts, key=lambda p: p.showtime_ts)
+        high = bisect.bisect_left(
+            playtimes, end_ts, lo=low, key=lambda p: p.showtime_ts
+        )
+        return playtimes[low:high]
+
+    @staticmethod
+    def __insort(
+        playtimes: list[KinoDeFilmPlaytime], playtime: KinoDeFilmPlaytime
+    ) -> None:
+        bisect.insort(playtimes, playtime, key=lambda p: p.showtime_ts)
+
+
+class KinoDeProgramStore:
+    """Remembers the validators and a content hash of each cinema's program
+    list, so unchanged programs don't have to be fetched again."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def get(self, city_name: str, cinema_name: str) -> CinemaProgram | None:
+        with Session(self.engine) as session:
+            return session.get(CinemaProgram, (city_name, cinema_name))
+
+    def save(
+        self,
+        city_name: str,
+        cinema_name: str,
+        etag: str | None,
+        last_modified: str | None,
+        content_hash: str,
+    ) -> None:
+        with Session(self.engine) as session:
+            program = session.get(CinemaProgram, (city_name, cinema_name))
+            if program is None:
+                program = CinemaProgram(city=city_name, cinema=cinema_name)
+                session.add(program)
+
+            program.etag = etag
+            program.last_modified = last_modified
+            program.content_hash = content_hash
+            program.checked_at = datetime.now(timezone.utc)
+            session.commit()
+
+
+class KinoDeScaper:
+    # Only the program list is needed, the rest of the page is never built
+    CINEMA_PROGRAM_STRAINER = SoupStrainer("ul", class_="cinema-movies")
+    CINEMA_PROGRAM_START = re.compile(r'<ul[^>]*class="[^"]*\bcinema-movies\b')
+    UL_TAG = re.compile(r"<(/?)ul\b", re.IGNORECASE)
+
+    def __init__(
+        self,
+        timezone: str = "Europe/Berlin",
+        parser: str = HTML_PARSER,
+        program_store: KinoDeProgramStore = None,
+    ):
+        self.base_url = "https://www.kino.de"
+        self.parser = parser
+        self.program_store = program_store
+        parsed_url = urlparse.urlparse(self.base_url)
+        self.default_scheme = parsed_url.scheme
+        self.films = {}
+        self.zoneinfo = ZoneInfo(timezone)
+        # one shared instance per cinema, referenced by all its playtimes
+        self.cinemas: dict[tuple[str, str, str], KinoDeCinema] = {}
+        # last parsed program per (city, cinema) as (content hash, films)
+        self.programs: dict[tuple[str, str], tuple[str, list[KinoDeFilm]]] = {}
+
+    def scrape_films(self, city_name: str, cinema_name: str):
+        response = httpx.get(
+            self._cinema_program_url(city_name, cinema_name),
+            headers=self._conditional_headers(city_name, cinema_name),
+        )
+        return self._handle_program_response(response, city_name, cinema_name)
+
+    async def scrape_films_async(
+        self,
+        cinema_ids: list[tuple[str, str]],
+        max_concurrency: int = 8,
+    ) -> list[KinoDeFilm]:
+        """Scrapes the program of all given (city, cinema) pairs concurrently
+        over one pooled client and returns the merged films."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        limits = httpx.Limits(
+            max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+        )
+
+        # Only the requests run on the event loop, reading and storing the
+        # program state and parsing run in threads. Each program only touches
+        # its own (city, cinema) entries, so they don't get in each other's way.
+        async def scrape(client: httpx.AsyncClient, city_name: str, cinema_name: str):
+            headers = await asyncio.to_thread(
+                self._conditional_headers, city_name, cinema_name
+            )
+            async with semaphore:
+                response = await client.get(
+                    self._cinema_program_url(city_name, cinema_name),
+                    headers=headers,
+                )
+            return await asyncio.to_thread(
+                self._handle_program_response, response, city_name, cinema_name
+            )
+
+        async with httpx.AsyncClient(limits=limits) as client:
+            results = await asyncio.gather(
+                *(
+                    scrape(client, city_name, cinema_name)
+                    for city_name, cinema_name in cinema_ids
+                )
+            )
+
+        films = []
+        for cinema_films in results:
+            films.extend(cinema_films)
+        return self.flatten_films(films)
+
+    def flatten_films(self, films: list[KinoDeFilm]) -> list[KinoDeFilm]:
+        return KinoDeShowtimeIndex(films).films()
+
+    def _cinema_program_url(self, city: str, cinema_name: str) -> str:
+        return f"{self.base_url}/kinoprogramm/stadt/{city}/kino/{cinema_name}/"
+
+    def _conditional_headers(self, city_name: str, cinema_name: str) -> dict:
+        # A 304 has no body, so only ask for one while the films are in memory
+        if self.program_store is None or (city_name, cinema_name) not in self.programs:
+            return {}
+
+        program = self.program_store.get(city_name, cinema_name)
+        headers = {}
+        if program is not None and program.etag is not None:
+            headers["If-None-Match"] = program.etag
+        if program is not None and program.last_modified is not None:
+            headers["If-Modified-Since"] = program.last_modified
+        return headers
+
+    def _handle_program_response(
+        self, response: httpx.Response, city_name: str, cinema_name: str
+    ) -> list[KinoDeFilm]:
+        """Returns the films of a program response. Unchanged programs are not
+        parsed again."""
+        program_key = (city_name, cinema_name)
+        if response.status_code == httpx.codes.NOT_MODIFIED:
+            return self.programs[program_key][1]
+        response.raise_for_status()
+
+        content_hash = self._cinema_program_hash(response.text)
+        if self.program_store is not None:
+            self.program_store.save(
+                city_name,
+                cinema_name,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                content_hash,
+            )
+
+        cached_program = self.programs.get(program_key)
+        if cached_program is not None and cached_program[0] == content_hash:
+            return cached_program[1]
+
+        soup = self._parse_html(response.text)
+        films = self._parse_cinema_program(soup, city_name, cinema_name)
+        self.programs[program_key] = (content_hash, films)
+        return films
+
+    def _cinema_program_hash(self, text: str) -> str:
+        """Hashes the ul.cinema-movies section, ignoring the rest of the page."""
+        start = self.CINEMA_PROGRAM_START.search(text)
+        if start is None:
+            return hashlib.sha256(b"").hexdigest()
+
+        depth = 0
+        end = len(text)
+        for ul_tag in self.UL_TAG.finditer(text, start.start()):
+            depth += -1 if ul_tag.group(1) else 1
+            if depth == 0:
+                end = ul_tag.end()
+                break
+        return hashlib.sha256(text[start.start() : end].encode()).hexdigest()
+
+    def _parse_html(self, text: str) -> BeautifulSoup:
+        return BeautifulSoup(text, self.parser, parse_only=self.CINEMA_PROGRAM_STRAINER)
+
+    def _parse_cinema_program(
+        self, soup: BeautifulSoup, city_name: str, cinema_name: str
+    ) -> list[KinoDeFilm]:
+        cinema_movies = soup.select("ul.cinema-movies li.cinema-movie")
+        return self._parse_cinema_movies(cinema_movies, city_name, cinema_name)
+
+    def _parse_cinema_movies(
+        self, cinema_movies: list[PageElement], city_name: str, cinema_name: str
+    ) -> list[KinoDeFilm]:
+        films = []
+        for cinema_movie in cinema_movies:
+            # film title and link to kino.de page
+            title_link_element = cinema_movie.select_one(
+                ".alice-teaser-title a.alice-teaser-link"
+            )
+            title = title_link_element.get_text()
+            link = self.__fix_url(title_link_element.get("href"))
+
+            # film poster
+            image_element = cinema_movie.select_one(".alice-teaser-image img")
+            poster = self.__fix_url(image_element.get("data-src"))
+
+            schedules_container = cinema_movie.select_one("ol.schedules-container")
+            cinema_display_name = schedules_container.get("data-cinema-name")
+            cinema = self._get_cinema(city_name, cinema_name, cinema_display_name)
+
+            schedule_playtimes = cinema_movie.select(
+                "ol.schedules-container li.schedule-playtime"
+            )
+            playtimes = self._parse_playtimes(schedule_playtimes, cinema)
+            imdb_id = playtimes[0].imdb_id
+
+            film = KinoDeFilm(
+                title=title,
+                page_url=link,
+                poster_url=poster,
+                playtimes=playtimes,
+                imdb_id=imdb_id,
+            )
+            films.append(film)
+        return films
+
+    def _parse_playtimes(
+        self, playtimes: list[PageElement], cinema: KinoDeCinema
+    ) -> list[KinoDeFilmPlaytime]:
+        film_playtimes = []
+        for playtime in playtimes:
+            link = playtime.select_one("a")
+            shop_url = link.get("href")
+
+            query_params = urlparse.parse_qs(urlparse.urlsplit(shop_url).query)
+            imdb_id = sys.intern(query_params.get("imdb")[0])
+            showtime_ts = int(query_params.get("showtime_date")[0])
+
+            film_playtime = KinoDeFilmPlaytime(
+                cinema=cinema,
+                shop_url=shop_url,
+                imdb_id=imdb_id,
+                showtime_ts=showtime_ts,
+            )
+            film_playtimes.append(film_playtime)
+
+        return film_playtimes
+
+    def _get_cinema(
+        self, city_name: str, cinema_name: str, display_name: str
+    ) -> KinoDeCinema:
+        cinema_key = (city_name, cinema_name, display_name)
+        cinema = self.cinemas.get(cinema_key)
+        if cinema is None:
+            cinema = KinoDeCinema(
+                name=cinema_name,
+                city=city_name,
+                display_name=display_name,
+                zoneinfo=self.zoneinfo,
+            )
+            self.cinemas[cinema_key] = cinema
+        return cinema
+
+    def __fix_url(self, url: str) -> str:
+        if url.startswith("//"):
+            return f"{self.default_scheme}:{url}"
+        return
@@ -1,13 +1,24 @@
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+import threading
 import httpx
 from typing import Self
 
+from letterboxd_followbot import metrics, tracing
 from letterboxd_followbot.config import Config
+from letterboxd_followbot.letterboxd.film import FilmStore, activity_film
+from letterboxd_followbot.letterboxd.scheduler import RequestScheduler
 
 
 class LetterboxdClient:
     def __init__(
-        self, client_id: str, client_secret: str, base_url: str = None
+        self,
+        client_id: str,
+        client_secret: str,
+        base_url: str = None,
+        transport: httpx.BaseTransport = None,
+        scheduler: RequestScheduler = None,
+        film_store: FilmStore = None,
     ) -> None:
         if base_url is None:
             base_url = "https://api.letterboxd.com/api/v0"
@@ -16,13 +27,32 @@ class LetterboxdClient:
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token_expiry = None
-        self.client = httpx.Client()
-
-        self.__acquire_access_token()
+        self.__access_token = None
+        self.client = httpx.Client(transport=transport)
+        self.scheduler = scheduler
+        self.film_store = film_store
+        self.__token_lock = threading.Lock()
 
     @classmethod
-    def from_config(cls) -> Self:
-        return cls(Config.LETTERBOXD_CLIENT_ID, Config.LETTERBOXD_CLIENT_SECRET)
+    def from_config(cls, film_store: FilmStore = None) -> Self:
+        return cls(
+            Config.LETTERBOXD_CLIENT_ID,
+            Config.LETTERBOXD_CLIENT_SECRET,
+            scheduler=RequestScheduler(
+                Config.LETTERBOXD_MAX_CONCURRENT_REQUESTS,
+                Config.LETTERBOXD_RESERVED_INTERACTIVE,
+            ),
+            film_store=film_store,
+        )
+
+    def __slot(self):
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot()
+
+    def __remember_films(self, films: list[dict]) -> None:
+        if self.film_store is not None:
+            self.film_store.remember(films)
 
     def __acquire_access_token(self) -> None:
         url = f"{self.base_url}/auth/token"
@@ -32,22 +62,42 @@ class LetterboxdClient:
             "grant_type": "client_credentials",
         }
 
-        response = httpx.post(url, data=data)
+        with self.__slot():
+            response = self.client.post(url, data=data)
         response.raise_for_status()
         restponse_json = response.json()
 
         self.access_token_expiry = datetime.now() + timedelta(
             seconds=restponse_json["expires_in"]
         )
+        self.__access_token = restponse_json["access_token"]
 
-        self.client.headers["Authorization"] = (
-            f"Bearer {restponse_json["access_token"]}"
-        )
+    def __authorize(self, request: httpx.Request) -> httpx.Request:
+        # Added per request instead of to the shared client's headers, so
+        # requests made while another thread fetches a token keep theirs
+        request.headers["Authorization"] = f"Bearer {self.__access_token}"
+        return request
 
     def __refresh_access_token(self) -> None:
-        now = datetime.now() - timedelta(seconds=300)
-        if self.access_token_expiry < now:
-            self.__acquire_access_token()
+        # requests from several threads must not all fetch a new token
+        with self.__token_lock:
+            # The token is acquired with the first request, not on construction
+            if self.access_token_expiry is None:
+                self.__acquire_access_token()
+                return
+
+            # renewed 5 minutes before it expires
+            if self.access_token_expiry - timedelta(seconds=300) < datetime.now():
+                self.__acquire_access_token()
+
+    def __get(self, endpoint: str, url: str, params: list = None) -> httpx.Response:
+        with (
+            self.__slot(),
+            metrics.LETTERBOXD_REQUEST_DURATION.time(endpoint=endpoint),
+        ):
+            response = self.client.get(url, params=params, auth=self.__authorize)
+        metrics.LETTERBOXD_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        return response
 
     def search(self, input: str, include: list[str] = []) -> dict:
         self.__refresh_access_token()
@@ -56,56 +106,111 @@ class LetterboxdClient:
         for include_value in include:
             params.append(("include", include_value))
 
-        response = self.client.get(f"{self.base_url}/search", params=params)
+        response = self.__get("search", f"{self.base_url}/search", params=params)
 
         response.raise_for_status()
-        return response.json()
+        results = response.json()
+        self.__remember_films(
+            [item["film"] for item in results["items"] if "film" in item]
+        )
+        return results
 
-    def search_film_via_imdb_id(self, imdb_id: str) -> dict:
+    def search_film_via_imdb_id(self, imdb_id: str) -> dict | None:
         response = self.search(input=f"imdb:{imdb_id}", include=["FilmSearchItem"])
+        if len(response["items"]) == 0:
+            return None
         return response["items"][0]["film"]
 
+    def get_member(self, member_id: str) -> dict:
+        self.__refresh_access_token()
+
+        response = self.__get("member", f"{self.base_url}/member/{member_id}")
+
+        response.raise_for_status()
+        return response.json()
+
     def get_member_own_activity(
         self, member_id: str, include: list[str] = [], cursor: str = None
+    ) -> dict:
+        return self.get_member_activity(member_id, "OwnActivity", include, cursor)
+
+    def get_member_network_activity(
+        self, member_id: str, include: list[str] = [], cursor: str = None
+    ) -> dict:
+        """Activity of the members that member_id follows."""
+        return self.get_member_activity(member_id, "NetworkActivity", include, cursor)
+
+    def get_member_activity(
+        self,
+        member_id: str,
+        where: str,
+        include: list[str] = [],
+        cursor: str = None,
     ) -> dict:
         self.__refresh_access_token()
 
-        params = [("where", "OwnActivity")]
+        params = [("where", where)]
         for include_value in include:
             params.append(("include", include_value))
         if cursor is not None:
             params.append(("cursor", cursor))
 
-        response = self.client.get(
-            f"{self.base_url}/member/{member_id}/activity", params=params
+        response = self.__get(
+            "member_activity",
+            f"{self.base_url}/member/{member_id}/activity",
+            params=params,
         )
 
         response.raise_for_status()
 
-        return response.json()
+        activities = response.json()
+        self.__remember_films(
+            [activity_film(activity) for activity in activities["items"]]
+        )
+        return activities
 
     def get_member_watchlist(
         self, member_id: str, cursor: str = None, per_page: str = 20
     ) -> dict:
         self.__refresh_access_token()
 
-        response = self.client.get(f"{self.base_url}/member/{member_id}/watchlist")
         params = []
         if cursor is not None:
             params.append(("cursor", cursor))
         if per_page is not None:
             params.append(("perPage", per_page))
 
+        response = self.__get(
+            "member_watchlist",
+            f"{self.base_url}/member/{member_id}/watchlist",
+            params=params,
+        )
+
         response.raise_for_status()
-        return response.json()
+        watchlist = response.json()
+        self.__remember_films(watchlist["items"])
+        return watchlist
+
+    @tracing.traced("get_film_statistics")
+    def get_film_statistics(self, film_id: str, cached: bool = True) -> dict:
+        """With a film store, statistics it has are returned without a
+        request unless cached is False, and fetched ones are stored."""
+        if cached and self.film_store is not None:
+            statistics = self.film_store.get_statistics(film_id)
+            if statistics is not None:
+                return statistics
 
-    def get_film_statistics(self, film_id: str) -> dict:
         self.__refresh_access_token()
 
-        response = self.client.get(f"{self.base_url}/film/{film_id}/statistics")
+        response = self.__get(
+            "film_statistics", f"{self.base_url}/film/{film_id}/statistics"
+        )
 
         response.raise_for_status()
-        return response.json()
+        statistics = response.json()
+        if self.film_store is not None:
+            self.film_store.remember_statistics(film_id, statistics)
+        return statistics
 
     def get_films(
         self,
@@ -129,7 +234,9 @@ class LetterboxdClient:
         if per_page is not None:
             params.append(("perPage", per_page))
 
-        response = self.client.get(f"{self.base_url}/films", params=params)
+        response = self.__get("films", f"{self.base_url}/films", params=params)
 
         response.raise_for_status()
-        return response.json()
+        films = response.json()
+        self.__remember_films(films["items"])
+        return films
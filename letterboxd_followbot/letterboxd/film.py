@@ -0,0 +1,195 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterable
+
+from sqlalchemy import Engine, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from letterboxd_followbot import metrics
+from letterboxd_followbot.database.model import Film
+
+if TYPE_CHECKING:
+    from letterboxd_followbot.letterboxd.api import LetterboxdClient
+
+
+def activity_film(activity: dict) -> dict | None:
+    """Returns the film an activity is about, if it has one."""
+    for key in ("diaryEntry", "review"):
+        if key in activity:
+            return activity[key].get("film")
+    return activity.get("film")
+
+
+class FilmStore:
+    """Keeps the films passing through LetterboxdClient in the film table.
+
+    The client hands every film of its responses (activities, film lists,
+    watchlists and searches) to remember(), so name, release year,
+    directors, rating and poster sizes of a film are known locally from the
+    first time it shows up. A film is written at most once a day per
+    process.
+
+    Film statistics are stored with the film and served for
+    statistics_max_age. refresh_statistics() renews them in bulk for the
+    films seen recently, before they expire, so rendering an activity
+    rarely has to wait for a statistics request.
+    """
+
+    MEMORY_SIZE = 16384
+
+    def __init__(
+        self,
+        engine: Engine,
+        statistics_max_age: timedelta = timedelta(hours=6),
+        max_workers: int = 8,
+    ) -> None:
+        self.engine = engine
+        self.statistics_max_age = statistics_max_age
+        self.max_workers = max_workers
+        self.logger = logging.getLogger(__name__)
+        # film id -> day it was last written
+        self.__written: OrderedDict[str, date] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def remember(self, films: Iterable[dict]) -> None:
+        now = datetime.now(timezone.utc)
+        today = now.date()
+
+        with self.__lock:
+            films = {
+                film["id"]: film
+                for film in films
+                if film is not None and self.__written.get(film["id"]) != today
+            }
+        if len(films) == 0:
+            return
+
+        with Session(self.engine) as session:
+            existing = {
+                film.id: film
+                for film in session.scalars(select(Film).where(Film.id.in_(films)))
+            }
+            for film_id, film in films.items():
+                row = existing.get(film_id)
+                if row is None:
+                    row = Film(id=film_id)
+                    session.add(row)
+                self.__update(row, film, now)
+            try:
+                session.commit()
+            except IntegrityError:
+                # another thread or notifier instance inserted one of the
+                # films first, they are written the next time they show up
+                self.logger.info("Films were inserted concurrently, retrying later")
+                return
+
+        # only marked once written, so films of a failed write are retried
+        with self.__lock:
+            for film_id in films:
+                self.__remember(film_id, today)
+
+    def get_statistics(self, film_id: str) -> dict | None:
+        """Returns the stored statistics of a film, unless they are older
+        than statistics_max_age."""
+        with Session(self.engine) as session:
+            film = session.get(Film, film_id)
+            if (
+                film is None
+                or film.statistics is None
+                or self.__expired(film.statistics_updated_at, self.statistics_max_age)
+            ):
+                metrics.CACHE_REQUESTS.inc(cache="film_statistics", result="miss")
+                return None
+
+            metrics.CACHE_REQUESTS.inc(cache="film_statistics", result="hit")
+            return film.statistics
+
+    def remember_statistics(self, film_id: str, statistics: dict) -> None:
+        with Session(self.engine) as session:
+            film = session.get(Film, film_id)
+            # only films seen in a response are stored
+            if film is None:
+                return
+            film.statistics = statistics
+            film.statistics_updated_at = datetime.now(timezone.utc)
+            session.commit()
+
+    def refresh_statistics(
+        self,
+        letterboxd_client: "LetterboxdClient",
+        seen_within: timedelta = timedelta(days=7),
+        limit: int = 500,
+    ) -> int:
+        """Fetches the statistics of the films seen within seen_within that
+        are past half of statistics_max_age, most recently seen first and
+        concurrently. Returns the number of films refreshed."""
+        now = datetime.now(timezone.utc)
+        with Session(self.engine) as session:
+            film_ids = session.scalars(
+                select(Film.id)
+                .where(
+                    Film.seen_at >= now - seen_within,
+                    or_(
+                        Film.statistics_updated_at.is_(None),
+                        Film.statistics_updated_at < now - self.statistics_max_age / 2,
+                    ),
+                )
+                .order_by(Film.seen_at.desc())
+                .limit(limit)
+            ).all()
+        if len(film_ids) == 0:
+            return 0
+
+        self.logger.info(f"Refreshing statistics of {len(film_ids)} films")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # every request keeps the priority of the calling context
+            futures = [
+                executor.submit(
+                    copy_context().run, self.__fetch, letterboxd_client, film_id
+                )
+                for film_id in film_ids
+            ]
+        return sum(future.result() for future in futures)
+
+    def __fetch(self, letterboxd_client: "LetterboxdClient", film_id: str) -> bool:
+        try:
+            letterboxd_client.get_film_statistics(film_id, cached=False)
+            return True
+        except Exception:
+            self.logger.exception(f"Failed to refresh statistics of film {film_id}")
+            return False
+
+    def __remember(self, film_id: str, today: date) -> None:
+        self.__written[film_id] = today
+        self.__written.move_to_end(film_id)
+        if len(self.__written) > self.MEMORY_SIZE:
+            self.__written.popitem(last=False)
+
+    @staticmethod
+    def __update(row: Film, film: dict, now: datetime) -> None:
+        row.name = film["name"]
+        row.release_year = film.get("releaseYear")
+        row.rating = film.get("rating")
+        row.letterboxd_url = next(
+            (
+                link["url"]
+                for link in film.get("links", [])
+                if link["type"] == "letterboxd"
+            ),
+            None,
+        )
+        row.directors = [director["name"] for director in film.get("directors", [])]
+        row.poster_sizes = film["poster"]["sizes"] if "poster" in film else None
+        row.seen_at = now
+
+    @staticmethod
+    def __expired(updated_at: datetime | None, max_age: timedelta) -> bool:
+        if updated_at is None:
+            return True
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return updated_at + max_age < datetime.now(timezone.utc)
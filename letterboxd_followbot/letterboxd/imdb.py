@@ -0,0 +1,98 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from letterboxd_followbot import metrics
+from letterboxd_followbot.database.model import ImdbFilm
+from letterboxd_followbot.letterboxd.api import LetterboxdClient
+
+
+class ImdbFilmResolver:
+    """Resolves IMDb ids to Letterboxd films through a persistent cache.
+
+    Hits are kept forever. Misses are cached as well, and only retried once
+    miss_ttl has passed, so titles Letterboxd doesn't know yet don't cost
+    a search on every run. Ids that are not cached are searched
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        letterboxd_client: LetterboxdClient,
+        engine: Engine,
+        max_workers: int = 8,
+        miss_ttl: timedelta = timedelta(days=7),
+    ) -> None:
+        self.letterboxd_client = letterboxd_client
+        self.engine = engine
+        self.max_workers = max_workers
+        self.miss_ttl = miss_ttl
+        self.logger = logging.getLogger(__name__)
+
+    def resolve(self, imdb_ids: list[str]) -> dict[str, ImdbFilm]:
+        """Returns the cache entry for every id that could be looked up.
+
+        Entries for films unknown to Letterboxd have film_id set to None.
+        Ids whose search failed are left out and retried on the next call.
+        """
+        imdb_ids = set(imdb_ids)
+        now = datetime.now(timezone.utc)
+
+        with Session(self.engine, expire_on_commit=False) as session:
+            cached = session.scalars(
+                select(ImdbFilm).where(ImdbFilm.imdb_id.in_(imdb_ids))
+            ).all()
+
+            result = {}
+            for imdb_film in cached:
+                if imdb_film.film_id is None and self.__miss_expired(imdb_film, now):
+                    continue
+                result[imdb_film.imdb_id] = imdb_film
+
+            unresolved = sorted(imdb_ids - result.keys())
+            metrics.CACHE_REQUESTS.inc(len(result), cache="imdb_film", result="hit")
+            metrics.CACHE_REQUESTS.inc(
+                len(unresolved), cache="imdb_film", result="miss"
+            )
+            if len(unresolved) == 0:
+                return result
+
+            self.logger.info(f"Resolving {len(unresolved)} IMDb ids")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # the searches keep the request priority of the caller
+                futures = [
+                    executor.submit(copy_context().run, self.__search, imdb_id)
+                    for imdb_id in unresolved
+                ]
+            films = [future.result() for future in futures]
+
+            for imdb_id, (found, film) in zip(unresolved, films):
+                if not found:
+                    continue
+                imdb_film = session.merge(
+                    ImdbFilm(
+                        imdb_id=imdb_id,
+                        film_id=film["id"] if film else None,
+                        film_name=film["name"] if film else None,
+                        resolved_at=now,
+                    )
+                )
+                result[imdb_id] = imdb_film
+            session.commit()
+
+        return result
+
+    def __search(self, imdb_id: str) -> tuple[bool, dict | None]:
+        try:
+            return True, self.letterboxd_client.search_film_via_imdb_id(imdb_id)
+        except Exception:
+            self.logger.exception(f"Failed to resolve IMDb id {imdb_id}")
+            return False, None
+
+    def __miss_expired(self, imdb_film: ImdbFilm, now: datetime) -> bool:
+        resolved_at = imdb_film.resolved_at.replace(tzinfo=timezone.utc)
+        return resolved_at + self.miss_ttl < now
@@ -0,0 +1,118 @@
+import functools
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Callable, Iterator
+
+from letterboxd_followbot import metrics
+
+
+class RequestPriority(IntEnum):
+    # lower values are served first
+    INTERACTIVE = 0
+    NOTIFICATION = 1
+    POPULAR_TODO = 2
+
+
+_priority: ContextVar[RequestPriority] = ContextVar(
+    "letterboxd_request_priority", default=RequestPriority.NOTIFICATION
+)
+
+
+@contextmanager
+def priority(request_priority: RequestPriority) -> Iterator[None]:
+    """Makes the Letterboxd requests of the block use request_priority.
+
+    The priority is kept in a context variable, so it follows the block into
+    asyncio.to_thread() and into tasks created inside it.
+    """
+    token = _priority.set(request_priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> RequestPriority:
+    return _priority.get()
+
+
+def prioritized(request_priority: RequestPriority) -> Callable:
+    """Decorator running a coroutine function with priority()."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with priority(request_priority):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class RequestScheduler:
+    """Shares the Letterboxd request budget between the bot and the jobs.
+
+    At most capacity requests are in flight at once. The last reserved of
+    these slots are kept for INTERACTIVE requests, so a member search
+    starts right away even while the notifier and the popular todos use up
+    everything else. Requests waiting for a slot are started by priority,
+    and in order of arrival within one priority.
+    """
+
+    def __init__(self, capacity: int, reserved: int = 1) -> None:
+        if not 0 <= reserved < capacity:
+            raise ValueError("reserved has to be at least 0 and below capacity")
+
+        self.capacity = capacity
+        self.reserved = reserved
+        self.__in_flight = 0
+        self.__waiting: list[tuple[int, int]] = []
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+
+    @contextmanager
+    def slot(self, request_priority: RequestPriority = None) -> Iterator[None]:
+        """Blocks until the request may start and holds its slot until the
+        block is left. Without request_priority, the priority of the
+        current context is used."""
+        if request_priority is None:
+            request_priority = _priority.get()
+
+        start = time.perf_counter()
+        self.__acquire(request_priority)
+        metrics.LETTERBOXD_QUEUE_WAIT.observe(
+            time.perf_counter() - start, priority=request_priority.name.lower()
+        )
+        try:
+            yield
+        finally:
+            self.__release()
+
+    def __acquire(self, request_priority: RequestPriority) -> None:
+        entry = (request_priority, next(self.__sequence))
+        with self.__condition:
+            heapq.heappush(self.__waiting, entry)
+            self.__condition.wait_for(lambda: self.__may_start(entry))
+            heapq.heappop(self.__waiting)
+            self.__in_flight += 1
+            # the next waiter may be able to start as well
+            self.__condition.notify_all()
+
+    def __may_start(self, entry: tuple[int, int]) -> bool:
+        if self.__waiting[0] != entry:
+            return False
+        limit = self.capacity
+        if entry[0] != RequestPriority.INTERACTIVE:
+            limit -= self.reserved
+        return self.__in_flight < limit
+
+    def __release(self) -> None:
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify_all()
@@ -0,0 +1,119 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Engine, delete, select
+from sqlalchemy.orm import Session
+
+from letterboxd_followbot.database.model import WatchlistFilm, WatchlistSync
+from letterboxd_followbot.letterboxd.api import LetterboxdClient
+
+
+class WatchlistStore:
+    """Keeps the film ids on each member's watchlist in the database.
+
+    A member's watchlist is paged in full once and then every
+    resync_interval. In between it is kept up to date from the member's
+    activity: WatchlistActivity adds a film, and logging, reviewing, rating
+    or liking a film removes it, as Letterboxd does for watched films.
+    """
+
+    ADDING_ACTIVITY_TYPES = {"WatchlistActivity"}
+    REMOVING_ACTIVITY_TYPES = {
+        "DiaryEntryActivity",
+        "ReviewActivity",
+        "FilmRatingActivity",
+        "FilmLikeActivity",
+    }
+
+    def __init__(
+        self,
+        letterboxd_client: LetterboxdClient,
+        engine: Engine,
+        resync_interval: timedelta = timedelta(days=7),
+    ) -> None:
+        self.letterboxd_client = letterboxd_client
+        self.engine = engine
+        self.resync_interval = resync_interval
+        self.logger = logging.getLogger(__name__)
+
+    def get_film_ids(self, member_id: str) -> set[str]:
+        member_id = str(member_id)
+
+        with Session(self.engine) as session:
+            watchlist_sync = session.get(WatchlistSync, member_id)
+            if watchlist_sync is None or self.__sync_expired(watchlist_sync):
+                return self.__sync(session, member_id)
+
+            return set(
+                session.scalars(
+                    select(WatchlistFilm.film_id).where(
+                        WatchlistFilm.member_id == member_id
+                    )
+                )
+            )
+
+    def apply_activity(self, member_id: str, activity: dict) -> None:
+        activity_type = activity["type"]
+        if activity_type in self.ADDING_ACTIVITY_TYPES:
+            adding = True
+        elif activity_type in self.REMOVING_ACTIVITY_TYPES:
+            adding = False
+        else:
+            return
+
+        film_id = self.__activity_film_id(activity)
+        if film_id is None:
+            return
+
+        with Session(self.engine) as session:
+            watchlist_film = WatchlistFilm(member_id=str(member_id), film_id=film_id)
+            if adding:
+                session.merge(watchlist_film)
+            else:
+                session.execute(
+                    delete(WatchlistFilm).where(
+                        WatchlistFilm.member_id == watchlist_film.member_id,
+                        WatchlistFilm.film_id == film_id,
+                    )
+                )
+            session.commit()
+
+    def __sync(self, session: Session, member_id: str) -> set[str]:
+        self.logger.info(f"Syncing watchlist of {member_id}")
+
+        film_ids = set()
+        cursor = None
+        while True:
+            watchlist = self.letterboxd_client.get_member_watchlist(
+                member_id, cursor=cursor, per_page=100
+            )
+            film_ids.update(film["id"] for film in watchlist["items"])
+            if "next" not in watchlist:
+                break
+            cursor = watchlist["next"]
+
+        session.execute(
+            delete(WatchlistFilm).where(WatchlistFilm.member_id == member_id)
+        )
+        session.add_all(
+            WatchlistFilm(member_id=member_id, film_id=film_id) for film_id in film_ids
+        )
+        session.merge(
+            WatchlistSync(member_id=member_id, synced_at=datetime.now(timezone.utc))
+        )
+        session.commit()
+
+        return film_ids
+
+    def __sync_expired(self, watchlist_sync: WatchlistSync) -> bool:
+        synced_at = watchlist_sync.synced_at.replace(tzinfo=timezone.utc)
+        return synced_at + self.resync_interval < datetime.now(timezone.utc)
+
+    @staticmethod
+    def __activity_film_id(activity: dict) -> str | None:
+        if "film" in activity:
+            return activity["film"]["id"]
+        for entry_key in ("diaryEntry", "review"):
+            if entry_key in activity:
+                return activity[entry_key]["film"]["id"]
+        return None
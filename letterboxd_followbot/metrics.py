@@ -0,0 +1,221 @@
+"""Minimal Prometheus-style metrics.
+
+Counters and histograms are kept in process and rendered in the Prometheus
+text exposition format, served on /metrics by start_metrics_server.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metrics: list["_Metric"] = []
+_lock = threading.Lock()
+
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def _label_values(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[labelname]) for labelname in self.labelnames)
+
+    def _format_labels(self, label_values: tuple, extra: dict = {}) -> str:
+        labels = list(zip(self.labelnames, label_values)) + list(extra.items())
+        if len(labels) == 0:
+            return ""
+        formatted = ",".join(
+            '{}="{}"'.format(
+                name,
+                value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+            )
+            for name, value in labels
+        )
+        return "{" + formatted + "}"
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        label_values = self._label_values(labels)
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{self._format_labels(label_values)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., count, sum]
+        self.values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        label_values = self._label_values(labels)
+        with _lock:
+            observed = self.values.setdefault(
+                label_values, [0] * (len(self.buckets) + 2)
+            )
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    observed[index] += 1
+            observed[-2] += 1
+            observed[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for label_values, observed in sorted(self.values.items()):
+            for bucket, count in zip(self.buckets, observed):
+                labels = self._format_labels(label_values, {"le": str(bucket)})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = self._format_labels(label_values, {"le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {observed[-2]}")
+            labels = self._format_labels(label_values)
+            lines.append(f"{self.name}_count{labels} {observed[-2]}")
+            lines.append(f"{self.name}_sum{labels} {observed[-1]}")
+        return lines
+
+
+def generate_latest() -> str:
+    with _lock:
+        lines = []
+        for metric in _metrics:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> asyncio.Server:
+    logger = logging.getLogger(__name__)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1] == "/metrics":
+                status = "200 OK"
+                body = generate_latest().encode()
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+
+            writer.write(
+                (
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+LETTERBOXD_REQUESTS = Counter(
+    "letterboxd_requests_total",
+    "Requests made to the Letterboxd API",
+    ("endpoint", "status"),
+)
+LETTERBOXD_REQUEST_DURATION = Histogram(
+    "letterboxd_request_duration_seconds",
+    "Latency of Letterboxd API requests",
+    ("endpoint",),
+)
+ACTIVITY_PROCESS_DURATION = Histogram(
+    "activity_process_duration_seconds",
+    "Time to render an activity into a member event",
+    ("type",),
+)
+LETTERBOXD_QUEUE_WAIT = Histogram(
+    "letterboxd_queue_wait_seconds",
+    "Time Letterboxd API requests waited for a slot of the request scheduler",
+    ("priority",),
+)
+TELEGRAM_SENDS = Counter(
+    "telegram_sends_total",
+    "Messages sent to Telegram",
+    ("method", "status"),
+)
+TELEGRAM_SEND_DURATION = Histogram(
+    "telegram_send_duration_seconds",
+    "Latency of Telegram send calls",
+    ("method",),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by result",
+    ("cache", "result"),
+)
+CYCLE_DURATION = Histogram(
+    "job_cycle_duration_seconds",
+    "Duration of one cycle of a background job, without sleeping",
+    ("job",),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+ACTIVITIES_FOUND = Counter(
+    "activities_found_total",
+    "New activities found for followed members",
+)
+FOLLOW_FAILURES = Counter(
+    "follow_failures_total",
+    "Failed polls of followed members, by backoff or quarantine",
+    ("result",),
+)
+JOB_RESTARTS = Counter(
+    "job_restarts_total",
+    "Background jobs restarted after they crashed",
+    ("job",),
+)
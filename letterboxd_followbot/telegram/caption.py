@@ -0,0 +1,171 @@
+import math
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Self
+
+from letterboxd_followbot.telegram.util import Util as TelegramUtil
+
+
+class CaptionBuilder:
+    """Collects the parts of a MarkdownV2 caption and joins them once.
+
+    Dynamic values are escaped once per value, static fragments (stars,
+    emoji) are escaped once per process and the lines describing a film
+    that never change (title, directors) are cached by film id.
+    """
+
+    HISTOGRAM_CHARS = "　▁▂▃▄▅▆▇█"
+    EMPTY_HISTOGRAM = TelegramUtil.escape_md("[　　　　　　　　　　]")
+    NUMBER_SUFFIXES = ["", "K", "M", "B"]
+
+    LIKE = TelegramUtil.escape_md("❤️")
+    REWATCH = TelegramUtil.escape_md("🔄")
+    REVIEW = TelegramUtil.escape_md("📝")
+
+    FILM_CACHE_SIZE = 1024
+
+    _film_cache: OrderedDict[str, str] = OrderedDict()
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+
+    def build(self) -> str:
+        return "".join(self.parts)
+
+    def append(self, markdown: str) -> Self:
+        self.parts.append(markdown)
+        return self
+
+    def line(self, text: str = "") -> Self:
+        if text:
+            self.parts.append(TelegramUtil.escape_md(text))
+        self.parts.append("\n")
+        return self
+
+    def film_lines(self, film: dict, film_stats: dict) -> Self:
+        self.parts.append(self.__film_static_lines(film))
+        self.__film_rating_line(film, film_stats)
+        self.__film_stats_line(film_stats)
+        return self
+
+    def log_lines(self, log_entry: dict) -> Self:
+        self.__log_details_line(log_entry)
+        self.__log_tags_line(log_entry)
+        return self
+
+    def rating_star_line(self, rating: float) -> Self:
+        self.parts.append(self.star_string(rating))
+        self.parts.append("\n")
+        return self
+
+    @classmethod
+    def star_string(cls, rating: float) -> str:
+        return _star_string(rating)
+
+    @classmethod
+    def __film_static_lines(cls, film: dict) -> str:
+        film_id = film["id"]
+        cached = cls._film_cache.get(film_id)
+        if cached is not None:
+            cls._film_cache.move_to_end(film_id)
+            return cached
+
+        result = cls.__film_title_line(film) + cls.__film_directors_line(film)
+
+        cls._film_cache[film_id] = result
+        if len(cls._film_cache) > cls.FILM_CACHE_SIZE:
+            cls._film_cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def __film_title_line(film: dict) -> str:
+        letterboxd_link = ""
+        for link in film["links"]:
+            if link["type"] == "letterboxd":
+                letterboxd_link = link["url"]
+                break
+
+        line = "[{}]({})".format(TelegramUtil.escape_md(film["name"]), letterboxd_link)
+        if "releaseYear" in film:
+            line += " \\({}\\)".format(film["releaseYear"])
+        return f"{line}\n"
+
+    @staticmethod
+    def __film_directors_line(film: dict) -> str:
+        if "directors" not in film or len(film["directors"]) == 0:
+            return ""
+        line = film["directors"][0]["name"]
+        if len(film["directors"]) > 1:
+            line += f" +{len(film['directors']) - 1}"
+        return f"{TelegramUtil.escape_md(line)}\n"
+
+    def __film_rating_line(self, film: dict, film_stats: dict) -> None:
+        self.parts.append(
+            _rating_histogram(
+                tuple(rating["count"] for rating in film_stats["ratingsHistogram"])
+            )
+        )
+        if "rating" in film:
+            self.parts.append(TelegramUtil.escape_md(f" {round(film['rating'], 1)}"))
+        self.parts.append("\n")
+
+    def __film_stats_line(self, film_stats: dict) -> None:
+        counts = film_stats["counts"]
+        self.line(
+            "👁️ {} ❤️ {} 🗒️ {}".format(
+                self.__round_number_with_suffix(counts["watches"]),
+                self.__round_number_with_suffix(counts["likes"]),
+                self.__round_number_with_suffix(counts["reviews"]),
+            )
+        )
+
+    def __log_details_line(self, log_entry: dict) -> None:
+        details = []
+        if "rating" in log_entry:
+            details.append(self.star_string(log_entry["rating"]))
+        if "like" in log_entry and log_entry["like"]:
+            details.append(self.LIKE)
+        if "diaryDetails" in log_entry and log_entry["diaryDetails"]["rewatch"]:
+            details.append(self.REWATCH)
+        if "review" in log_entry:
+            details.append(self.REVIEW)
+        self.parts.append(" ".join(detail for detail in details if detail))
+        self.parts.append("\n")
+
+    def __log_tags_line(self, log_entry: dict) -> None:
+        if len(log_entry["tags2"]) > 0:
+            self.line(" ".join(f"#{tag['displayTag']}" for tag in log_entry["tags2"]))
+
+    @classmethod
+    def __round_number_with_suffix(cls, number: int) -> str:
+        suffix_index = 0
+
+        while number >= 1000:
+            number /= 1000
+            suffix_index += 1
+
+        return f"{round(number, 1)}{cls.NUMBER_SUFFIXES[suffix_index]}"
+
+
+@lru_cache(maxsize=32)
+def _star_string(rating: float) -> str:
+    full_stars = math.floor(rating)
+    half_star = math.ceil(rating - full_stars)
+
+    return TelegramUtil.escape_md("★" * full_stars + "½" * half_star)
+
+
+@lru_cache(maxsize=4096)
+def _rating_histogram(counts: tuple[int, ...]) -> str:
+    biggest_count = max(counts)
+    if biggest_count == 0:
+        return CaptionBuilder.EMPTY_HISTOGRAM
+
+    chars = CaptionBuilder.HISTOGRAM_CHARS
+    result = "".join(chars[math.ceil(count / biggest_count * 8)] for count in counts)
+    return TelegramUtil.escape_md(f"[{result}]")
+
+
+# Warm the star cache with every half-star rating Letterboxd can return
+for _half_stars in range(1, 11):
+    _star_string(_half_stars / 2)
@@ -0,0 +1,133 @@
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Sequence
+
+from sqlalchemy import Engine, delete
+from sqlalchemy.orm import Session
+from telegram import Message
+from telegram.error import BadRequest
+
+from letterboxd_followbot import metrics
+from letterboxd_followbot.database.model import TelegramFile
+
+
+class FileIdCache:
+    """Maps photo urls (posters, avatars) to the Telegram file_id of their
+    first upload, so later sends to any chat don't make Telegram download
+    the image again.
+
+    Entries are persisted in the telegram_file table and kept in a bounded
+    in-memory layer in front of it. A file_id Telegram rejects is dropped
+    by send_photo() and send_photos(), which send the url instead.
+    """
+
+    MEMORY_SIZE = 4096
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.__file_ids: OrderedDict[str, str] = OrderedDict()
+        self.logger = logging.getLogger(__name__)
+
+    def get(self, url: str) -> str | None:
+        file_id = self.__file_ids.get(url)
+        if file_id is not None:
+            self.__file_ids.move_to_end(url)
+            metrics.CACHE_REQUESTS.inc(cache="telegram_file", result="hit")
+            return file_id
+
+        with Session(self.engine) as session:
+            telegram_file = session.get(TelegramFile, url)
+            if telegram_file is None:
+                metrics.CACHE_REQUESTS.inc(cache="telegram_file", result="miss")
+                return None
+            file_id = telegram_file.file_id
+
+        metrics.CACHE_REQUESTS.inc(cache="telegram_file", result="hit")
+        self.__remember(url, file_id)
+        return file_id
+
+    def get_photo(self, url: str) -> str:
+        """Returns the cached file_id for a photo url, or the url itself."""
+        file_id = self.get(url)
+        return url if file_id is None else file_id
+
+    def set(self, url: str, file_id: str) -> None:
+        if self.__file_ids.get(url) == file_id:
+            return
+
+        with Session(self.engine) as session:
+            session.merge(TelegramFile(url=url, file_id=file_id))
+            session.commit()
+
+        self.__remember(url, file_id)
+
+    def set_from_message(self, url: str, message: Message) -> None:
+        if message is None or not message.photo:
+            return
+        self.set(url, message.photo[-1].file_id)
+
+    def delete(self, url: str) -> None:
+        self.__file_ids.pop(url, None)
+        with Session(self.engine) as session:
+            session.execute(delete(TelegramFile).where(TelegramFile.url == url))
+            session.commit()
+
+    async def send_photo(
+        self, url: str, send: Callable[[str], Awaitable[Message]]
+    ) -> Message:
+        """Calls send with the cached file_id of the url, or the url itself,
+        and caches the file_id of the sent message."""
+
+        async def send_one(photos: list[str]) -> list[Message]:
+            return [await send(photos[0])]
+
+        (message,) = await self.send_photos([url], send_one)
+        return message
+
+    async def send_photos(
+        self,
+        urls: list[str],
+        send: Callable[[list[str]], Awaitable[Sequence[Message]]],
+    ) -> Sequence[Message]:
+        """Like send_photo() for a media group. If Telegram rejects one of
+        the cached file_ids, all of them are dropped and send is called
+        again with the urls."""
+        photos = [self.get_photo(url) for url in urls]
+        try:
+            messages = await send(photos)
+        except BadRequest as error:
+            if not self.is_rejected_file_id(error, photos, urls):
+                raise
+            self.logger.warning(f"Cached file_id rejected ({error}), sending urls")
+            for photo, url in zip(photos, urls):
+                if photo != url:
+                    self.delete(url)
+            messages = await send(list(urls))
+
+        for url, message in zip(urls, messages):
+            self.set_from_message(url, message)
+        return messages
+
+    @staticmethod
+    def is_rejected_file_id(
+        error: BadRequest, photos: list[str], urls: list[str]
+    ) -> bool:
+        """Whether the error is about one of the cached file_ids among the
+        sent photos rather than about a url."""
+        cached = [photo != url for photo, url in zip(photos, urls)]
+        if not any(cached):
+            return False
+
+        message = error.message.lower()
+        # e.g. "Wrong remote file identifier specified: wrong padding in the string"
+        if "remote file identifier" in message or "file_id" in message:
+            return True
+        # "Wrong file identifier/http url specified" is also the answer to a
+        # url Telegram can't fetch, so it only counts if no url was sent
+        return "file identifier" in message and all(cached)
+
+    def __remember(self, url: str, file_id: str) -> None:
+        self.__file_ids[url] = file_id
+        self.__file_ids.move_to_end(url)
+        if len(self.__file_ids) > self.MEMORY_SIZE:
+            self.__file_ids.popitem(last=False)
@@ -0,0 +1,179 @@
+import json
+from typing import Any
+
+from sqlalchemy import Engine, delete, select
+from sqlalchemy.orm import Session
+from telegram import Update
+from telegram.ext import (
+    Application,
+    BasePersistence,
+    ConversationHandler,
+    PersistenceInput,
+)
+
+from letterboxd_followbot.database.model import ConversationState, TelegramUserData
+
+
+class DatabasePersistence(BasePersistence):
+    """Keeps the conversation states and user_data in the database, so any
+    bot instance behind the webhook can continue a conversation another one
+    started.
+
+    The application only reads a persistence when it starts and writes it
+    every update_interval. user_data is read again before every update
+    through refresh_user_data(), and SharedConversationHandler reads and
+    writes the state of a conversation with every update. Chat, bot and
+    callback data are not stored.
+    """
+
+    def __init__(self, engine: Engine, update_interval: float = 60) -> None:
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self.engine = engine
+
+    def get_conversation_state(self, name: str, key: tuple) -> object:
+        with Session(self.engine) as session:
+            conversation_state = session.get(
+                ConversationState, (name, self.__encode_key(key))
+            )
+            return None if conversation_state is None else conversation_state.state
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        with Session(self.engine) as session:
+            conversation_states = session.scalars(
+                select(ConversationState).where(ConversationState.name == name)
+            ).all()
+            return {
+                self.__decode_key(conversation_state.key): conversation_state.state
+                for conversation_state in conversation_states
+            }
+
+    async def update_conversation(
+        self, name: str, key: tuple, new_state: object | None
+    ) -> None:
+        with Session(self.engine) as session:
+            if new_state is None:
+                session.execute(
+                    delete(ConversationState).where(
+                        ConversationState.name == name,
+                        ConversationState.key == self.__encode_key(key),
+                    )
+                )
+            else:
+                session.merge(
+                    ConversationState(
+                        name=name, key=self.__encode_key(key), state=new_state
+                    )
+                )
+            session.commit()
+
+    async def get_user_data(self) -> dict[int, dict[Any, Any]]:
+        with Session(self.engine) as session:
+            return {
+                user_data.user_id: dict(user_data.data)
+                for user_data in session.scalars(select(TelegramUserData))
+            }
+
+    async def update_user_data(self, user_id: int, data: dict[Any, Any]) -> None:
+        with Session(self.engine) as session:
+            session.merge(TelegramUserData(user_id=user_id, data=dict(data)))
+            session.commit()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict[Any, Any]) -> None:
+        with Session(self.engine) as session:
+            stored = session.get(TelegramUserData, user_id)
+        user_data.clear()
+        if stored is not None:
+            user_data.update(stored.data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        with Session(self.engine) as session:
+            session.execute(
+                delete(TelegramUserData).where(TelegramUserData.user_id == user_id)
+            )
+            session.commit()
+
+    async def get_chat_data(self) -> dict[int, dict[Any, Any]]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict[Any, Any]) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict[Any, Any]:
+        return {}
+
+    async def update_bot_data(self, data: dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict[Any, Any]) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data: object) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # every update is written right away
+        pass
+
+    @staticmethod
+    def __encode_key(key: tuple) -> str:
+        return json.dumps(list(key))
+
+    @staticmethod
+    def __decode_key(key: str) -> tuple:
+        return tuple(json.loads(key))
+
+
+class SharedConversationHandler(ConversationHandler):
+    """A persistent ConversationHandler whose state is shared by all
+    instances: the state of a conversation is read from the persistence
+    before an update is checked, and written as soon as it was handled.
+    """
+
+    def __init__(self, persistence: DatabasePersistence, *args, **kwargs) -> None:
+        super().__init__(*args, persistent=True, **kwargs)
+        self.database_persistence = persistence
+
+    def check_update(self, update: object):
+        if (
+            isinstance(update, Update)
+            and update.effective_chat is not None
+            and update.effective_user is not None
+        ):
+            key = self._get_key(update)
+            state = self.database_persistence.get_conversation_state(self.name, key)
+            # a state of None is no running conversation
+            self._conversations.update_no_track({key: state})
+        return super().check_update(update)
+
+    async def handle_update(
+        self,
+        update: Update,
+        application: Application,
+        check_result: object,
+        context: object,
+    ) -> object | None:
+        try:
+            return await super().handle_update(
+                update, application, check_result, context
+            )
+        finally:
+            # the application only marks the user_data after the handler
+            if update.effective_user is not None:
+                application.mark_data_for_update_persistence(
+                    user_ids=update.effective_user.id
+                )
+            await application.update_persistence()
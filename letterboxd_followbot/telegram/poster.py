@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Self
+
+from letterboxd_followbot.config import Config
+
+
+class PosterSelector:
+    """Picks the smallest poster size that still fills the display target.
+
+    Sizes that Telegram would reject for send_photo (width + height above
+    10000 or a side ratio above 20) are skipped. The choice is cached per
+    film id.
+    """
+
+    MAX_DIMENSION_SUM = 10000
+    MAX_RATIO = 20
+    CACHE_SIZE = 4096
+
+    def __init__(self, target_width: int = 0, target_height: int = 0) -> None:
+        self.target_width = target_width
+        self.target_height = target_height
+        self.__urls: OrderedDict[str, str | None] = OrderedDict()
+
+    @classmethod
+    def from_config(cls) -> Self:
+        return cls(Config.POSTER_TARGET_WIDTH, Config.POSTER_TARGET_HEIGHT)
+
+    def select_url(self, film: dict) -> str | None:
+        if "poster" not in film:
+            return None
+
+        film_id = film.get("id")
+        if film_id is not None and film_id in self.__urls:
+            self.__urls.move_to_end(film_id)
+            return self.__urls[film_id]
+
+        url = self.select_image_url(film["poster"])
+        if film_id is not None:
+            self.__remember(film_id, url)
+        return url
+
+    def select_image_url(self, image: dict) -> str | None:
+        sizes = sorted(
+            (size for size in image["sizes"] if self.__is_compatible(size)),
+            key=lambda size: (size["width"], size["height"]),
+        )
+        if len(sizes) == 0:
+            return None
+
+        for size in sizes:
+            if (
+                size["width"] >= self.target_width
+                and size["height"] >= self.target_height
+            ):
+                return size["url"]
+        return sizes[-1]["url"]
+
+    def __is_compatible(self, size: dict) -> bool:
+        width = size["width"]
+        height = size["height"]
+        if width <= 0 or height <= 0:
+            return False
+        if width + height > self.MAX_DIMENSION_SUM:
+            return False
+        return max(width / height, height / width) <= self.MAX_RATIO
+
+    def __remember(self, film_id: str, url: str | None) -> None:
+        self.__urls[film_id] = url
+        self.__urls.move_to_end(film_id)
+        if len(self.__urls) > self.CACHE_SIZE:
+            self.__urls.popitem(last=False)
@@ -1,35 +1,211 @@
-from bs4 import BeautifulSoup
+import re
+from html.parser import HTMLParser
+
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
 from telegram.helpers import escape_markdown
 
+from letterboxd_followbot import tracing
+
+
+class _HtmlSanitizer(HTMLParser):
+    """Streaming whitelist sanitizer.
+
+    Produces the same markup as parsing the text with BeautifulSoup's
+    html.parser tree builder, unwrapping every tag that is not allowed by
+    Telegram and serializing the result, without building a tree.
+    """
+
+    ALLOWED_TAGS = frozenset(
+        [
+            "b",
+            "strong",
+            "i",
+            "em",
+            "u",
+            "ins",
+            "s",
+            "strike",
+            "span",
+            "tg-spoiler",
+            "tg-emoji",
+            "a",
+            "code",
+            "pre",
+            "blockquote",
+        ]
+    )
+    EMPTY_ELEMENT_TAGS = frozenset(HTMLTreeBuilder.empty_element_tags)
+    PRESERVE_WHITESPACE_TAGS = frozenset(
+        HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS
+    )
+    CDATA_LIST_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+    ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+    NON_WHITESPACE = re.compile(r"\S+")
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.output: list[str] = []
+        self.data: list[str] = []
+        self.stack: list[str] = []
+        self.preserve_whitespace = 0
+        self.already_closed_empty_element: list[str] = []
+
+    def sanitize(self, text: str) -> str:
+        self.feed(text)
+        self.close()
+        self.end_data()
+        while self.stack:
+            self.pop_tag()
+        return "".join(self.output)
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_starttag(
+        self, tag: str, attrs: list, handle_empty_element: bool = True
+    ) -> None:
+        self.end_data()
+        self.stack.append(tag)
+        if tag in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserve_whitespace += 1
+        if tag in self.ALLOWED_TAGS:
+            self.output.append(self.render_starttag(tag, attrs))
+
+        if handle_empty_element and tag in self.EMPTY_ELEMENT_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed_empty_element.append(tag)
+
+    def handle_endtag(self, tag: str, check_already_closed: bool = True) -> None:
+        if check_already_closed and tag in self.already_closed_empty_element:
+            self.already_closed_empty_element.remove(tag)
+            return
+
+        self.end_data()
+        if tag not in self.stack:
+            return
+        while self.pop_tag() != tag:
+            pass
+
+    def handle_data(self, data: str) -> None:
+        self.data.append(data)
+
+    def handle_charref(self, name: str) -> None:
+        if name.startswith("x"):
+            real_name = int(name.lstrip("x"), 16)
+        elif name.startswith("X"):
+            real_name = int(name.lstrip("X"), 16)
+        else:
+            real_name = int(name)
+
+        data = None
+        if real_name < 256:
+            # Numeric references below 256 are often meant as Windows-1252
+            try:
+                data = bytearray([real_name]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(real_name)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name: str) -> None:
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data: str) -> None:
+        self.end_data()
+        self.handle_data(data)
+        self.end_data("<!--", "-->")
+
+    def handle_decl(self, data: str) -> None:
+        self.end_data()
+        self.handle_data(data[len("DOCTYPE ") :])
+        self.end_data("<!DOCTYPE ", ">\n")
+
+    def unknown_decl(self, data: str) -> None:
+        self.end_data()
+        if data.upper().startswith("CDATA["):
+            self.handle_data(data[len("CDATA[") :])
+            self.end_data("<![CDATA[", "]]>")
+        else:
+            self.handle_data(data)
+            self.end_data("<?", "?>")
+
+    def handle_pi(self, data: str) -> None:
+        self.end_data()
+        self.handle_data(data)
+        self.end_data("<?", ">")
+
+    def end_data(self, prefix: str = None, suffix: str = None) -> None:
+        if not self.data:
+            return
+
+        data = "".join(self.data)
+        self.data = []
+
+        if not self.preserve_whitespace and not data.strip(self.ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+
+        if prefix is None:
+            self.output.append(EntitySubstitution.substitute_xml(data))
+        else:
+            self.output.append(f"{prefix}{data}{suffix}")
+
+    def pop_tag(self) -> str:
+        tag = self.stack.pop()
+        if tag in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserve_whitespace -= 1
+        if tag in self.ALLOWED_TAGS:
+            self.output.append(f"</{tag}>")
+        return tag
+
+    def render_starttag(self, tag: str, attrs: list) -> str:
+        if not attrs:
+            return f"<{tag}>"
+
+        list_attributes = self.CDATA_LIST_ATTRIBUTES["*"]
+        list_attributes = list_attributes + self.CDATA_LIST_ATTRIBUTES.get(tag, [])
+        attr_dict = {}
+        for key, value in attrs:
+            if value is None:
+                value = ""
+            if key in list_attributes:
+                value = " ".join(self.NON_WHITESPACE.findall(value))
+            attr_dict[key] = value
+
+        result = [f"<{tag}"]
+        for key, value in sorted(attr_dict.items()):
+            value = EntitySubstitution.substitute_xml(value)
+            quote = '"'
+            if '"' in value:
+                if "'" in value:
+                    value = value.replace('"', "&quot;")
+                else:
+                    quote = "'"
+            result.append(f" {key}={quote}{value}{quote}")
+        result.append(">")
+        return "".join(result)
+
 
 class Util:
     @staticmethod
+    @tracing.traced("sanitize_html")
     def sanitize_html(text: str) -> str:
         # Replace <br> with new line characters
-        text = text.replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
+        if "<br" in text:
+            text = (
+                text.replace("<br>", "\n")
+                .replace("<br/>", "\n")
+                .replace("<br />", "\n")
+            )
 
         # Remove all tags except for the ones that are allowed by Telegram
-        soup = BeautifulSoup(text, "html.parser")
-        for e in soup.find_all():
-            if e.name not in [
-                "b",
-                "strong",
-                "i",
-                "em",
-                "u",
-                "ins",
-                "s",
-                "strike",
-                "span",
-                "tg-spoiler",
-                "tg-emoji",
-                "a",
-                "code",
-                "pre",
-                "blockquote",
-            ]:
-                e.unwrap()
-        return str(soup)
+        return _HtmlSanitizer().sanitize(text)
 
     @staticmethod
     def escape_md(text: str) -> str:
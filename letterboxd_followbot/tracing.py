@@ -0,0 +1,172 @@
+"""Lightweight spans for finding where a job cycle spends its time.
+
+span() and traced() time a block or a function. When opentelemetry is
+installed, every span is also started on its global tracer, so whatever
+exporter is configured there receives them. Nothing is exported otherwise.
+
+Inside cycle(), finished spans are summed up per name. When the cycle ends
+the breakdown is written to the log or appended to a JSONL file, depending
+on TRACE_OUTPUT.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+
+from letterboxd_followbot.config import Config
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+class _Cycle:
+    def __init__(self, job: str) -> None:
+        self.job = job
+        self.started_at = datetime.now(timezone.utc)
+        # span name -> [count, total seconds, seconds outside child spans]
+        self.stages: dict[str, list] = {}
+
+    def add(self, name: str, duration: float, self_duration: float) -> None:
+        stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+        stage[0] += 1
+        stage[1] += duration
+        stage[2] += self_duration
+
+    def breakdown(self, duration: float) -> dict:
+        traced = sum(stage[2] for stage in self.stages.values())
+        return {
+            "job": self.job,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(duration, 6),
+            "untraced": round(duration - traced, 6),
+            "stages": {
+                name: {
+                    "count": count,
+                    "total": round(total, 6),
+                    "self": round(self_duration, 6),
+                }
+                for name, (count, total, self_duration) in sorted(
+                    self.stages.items(), key=lambda item: -item[1][2]
+                )
+            },
+        }
+
+
+class _Span:
+    __slots__ = ("child_duration",)
+
+    def __init__(self) -> None:
+        self.child_duration = 0.0
+
+
+_current_cycle: ContextVar[_Cycle | None] = ContextVar("trace_cycle", default=None)
+_current_span: ContextVar[_Span | None] = ContextVar("trace_span", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _cycle_span(name: str) -> Iterator[None]:
+    cycle = _current_cycle.get()
+    if cycle is None:
+        yield
+        return
+
+    parent = _current_span.get()
+    current = _Span()
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        cycle.add(name, duration, duration - current.child_duration)
+        if parent is not None:
+            parent.child_duration += duration
+
+
+def _otel_span(name: str, attributes: dict):
+    if otel_trace is None:
+        return nullcontext()
+    return otel_trace.get_tracer(__name__).start_as_current_span(
+        name, attributes=attributes
+    )
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    with _otel_span(name, attributes), _cycle_span(name):
+        yield
+
+
+def traced(name: str = None) -> Callable:
+    """Decorator running every call of a function or coroutine in a span."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def cycle(job: str) -> Iterator[None]:
+    """Collects the spans of one job cycle and writes out their breakdown.
+
+    Does nothing unless TRACE_OUTPUT is set to "log" or a JSONL file path.
+    """
+    output = Config.TRACE_OUTPUT
+    if not output:
+        yield
+        return
+
+    current = _Cycle(job)
+    token = _current_cycle.set(current)
+    start = time.perf_counter()
+    try:
+        with _otel_span(f"{job}_cycle", {}):
+            yield
+    finally:
+        _current_cycle.reset(token)
+        _write_breakdown(output, current.breakdown(time.perf_counter() - start))
+
+
+def _write_breakdown(output: str, breakdown: dict) -> None:
+    if output == "log":
+        stages = ", ".join(
+            "{} {:.3f}s/{}".format(name, stage["self"], stage["count"])
+            for name, stage in breakdown["stages"].items()
+        )
+        logger.info(
+            "{} cycle took {:.3f}s: {}, untraced {:.3f}s".format(
+                breakdown["job"], breakdown["duration"], stages, breakdown["untraced"]
+            )
+        )
+        return
+
+    with open(output, "a", encoding="utf-8") as trace_file:
+        trace_file.write(json.dumps(breakdown) + "\n")
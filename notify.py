@@ -1,35 +1,47 @@
-import os
 import sys
 import asyncio
-import math
 import logging
-from datetime import datetime, timezone
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
+from typing import Awaitable, Callable
 
-from sqlalchemy import create_engine
+import httpx
+from sqlalchemy import delete, or_, select
 from sqlalchemy.orm import Session
-from telegram.ext import (
-    ExtBot,
-    ApplicationBuilder,
-)
-import dotenv
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
+from telegram.ext import ExtBot
 
 from letterboxd_followbot.database.model import (
     Chat,
     FollowMember,
+    FollowMemberType,
+    ImdbFilm,
     PopularTodo,
+    ShowtimeNotification,
 )
+from letterboxd_followbot.database.lease import ShardLeaseManager
 from letterboxd_followbot.letterboxd.api import LetterboxdClient
 from letterboxd_followbot.telegram.util import Util as TelegramUtil
+from letterboxd_followbot.telegram.caption import CaptionBuilder
+from letterboxd_followbot.telegram.poster import PosterSelector
+from letterboxd_followbot.telegram.file_cache import FileIdCache
+from letterboxd_followbot import metrics, tracing
 from letterboxd_followbot.config import Config
+from letterboxd_followbot.context import app_context
+from letterboxd_followbot.letterboxd import scheduler
+from letterboxd_followbot.letterboxd.scheduler import RequestPriority, prioritized
 from letterboxd_followbot.letterboxd.ext import LetterboxdExt
+from letterboxd_followbot.letterboxd.film import FilmStore, activity_film
+from letterboxd_followbot.letterboxd.imdb import ImdbFilmResolver
+from letterboxd_followbot.letterboxd.watchlist import WatchlistStore
+from letterboxd_followbot.kinode import KinoDeFilm, KinoDeProgramStore, KinoDeScaper
 
-engine = create_engine("sqlite:///data/local.db")
-
-dotenv.load_dotenv()
-
-TG_TOKEN = os.environ.get("TELEGRAM_TOKEN")
-app = ApplicationBuilder().token(TG_TOKEN).build()
+MEDIA_GROUP_MAX_SIZE = 10
+TELEGRAM_MESSAGE_MAX_LENGTH = 4096
 
 
 @dataclass
@@ -55,17 +67,35 @@ class ActivityHandler:
         self,
         telegram_bot: ExtBot,
         letterboxd_client: LetterboxdClient,
+        poster_selector: PosterSelector,
+        max_workers: int = 8,
     ) -> None:
         self.telegram_bot: ExtBot = telegram_bot
         self.letterboxd_client: LetterboxdClient = letterboxd_client
+        self.poster_selector: PosterSelector = poster_selector
+        self.max_workers: int = max_workers
         self.logger: logging.Logger = logging.getLogger(__name__)
+        self.__film_statistics: dict[str, dict] = {}
+
+    @tracing.traced("fetch_activities")
+    def fetch_activities(
+        self,
+        member_id: str,
+        after: datetime,
+        follow_type: FollowMemberType = FollowMemberType.MEMBER,
+    ) -> list[dict]:
+        # A FOLLOWING follow reads the network feed, which has the activity
+        # of everyone the member follows, so it needs one poll instead of N
+        if follow_type == FollowMemberType.FOLLOWING:
+            get_activity = self.letterboxd_client.get_member_network_activity
+        else:
+            get_activity = self.letterboxd_client.get_member_own_activity
 
-    def fetch_activities(self, member_id: str, after: datetime) -> list[dict]:
         done = False
         cursor = None
         result = []
         while not done:
-            activities = self.letterboxd_client.get_member_own_activity(
+            activities = get_activity(
                 member_id,
                 include=self.ACTIVITY_TYPES.keys(),
                 cursor=cursor,
@@ -86,6 +116,50 @@ class ActivityHandler:
         result.reverse()
         return result
 
+    @tracing.traced("prefetch_film_statistics")
+    def prefetch_film_statistics(self, activities: list[dict]) -> None:
+        """Fetches the statistics of every film in activities concurrently,
+        once per film, so rendering them doesn't wait for one statistics
+        request after the other."""
+        film_ids = {
+            film["id"]
+            for film in map(activity_film, activities)
+            if film is not None and film["id"] not in self.__film_statistics
+        }
+        if len(film_ids) == 0:
+            return
+
+        request_priority = scheduler.current_priority()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                film_id: executor.submit(
+                    self.__prefetch_film_statistics, request_priority, film_id
+                )
+                for film_id in film_ids
+            }
+
+        for film_id, future in futures.items():
+            try:
+                self.__film_statistics[film_id] = future.result()
+            except Exception:
+                # rendering the activity requests them again
+                self.logger.exception(f"Failed to prefetch statistics of {film_id}")
+
+    def __prefetch_film_statistics(
+        self, request_priority: RequestPriority, film_id: str
+    ) -> dict:
+        # the worker threads don't share the context of the cycle, so the
+        # concurrent requests don't count as nested spans of the prefetch
+        with scheduler.priority(request_priority):
+            return self.letterboxd_client.get_film_statistics(film_id)
+
+    def __get_film_statistics(self, film_id: str) -> dict:
+        film_stats = self.__film_statistics.get(film_id)
+        if film_stats is None:
+            film_stats = self.letterboxd_client.get_film_statistics(film_id)
+        return film_stats
+
+    @tracing.traced("process_activity")
     def process_activity(self, activity: dict) -> MemberEvent:
         activity_type = activity["type"]
         when_created = activity["whenCreated"]
@@ -99,7 +173,8 @@ class ActivityHandler:
         if activity_type not in self.ACTIVITY_TYPES:
             raise ValueError(f"Unknown activity type {activity_type}")
 
-        event = getattr(self, self.ACTIVITY_TYPES[activity_type])(activity)
+        with metrics.ACTIVITY_PROCESS_DURATION.time(type=activity_type):
+            event = getattr(self, self.ACTIVITY_TYPES[activity_type])(activity)
         event.when_created = when_created_dt
 
         return event
@@ -108,91 +183,85 @@ class ActivityHandler:
         diary_entry = activity["diaryEntry"]
         member = activity["member"]
         film = diary_entry["film"]
-        film_stats = self.letterboxd_client.get_film_statistics(film["id"])
+        film_stats = self.__get_film_statistics(film["id"])
 
-        caption = "📖 {} added to {} diary:\n".format(
-            TelegramUtil.escape_md(member["displayName"]),
-            TelegramUtil.escape_md(member["pronoun"]["possessiveAdjective"]),
+        caption = CaptionBuilder()
+        caption.line(
+            "📖 {} added to {} diary:".format(
+                member["displayName"], member["pronoun"]["possessiveAdjective"]
+            )
         )
-        caption += self.__log_lines(diary_entry)
-        caption += "\n"
-        caption += self.__film_lines(film, film_stats)
-        photo_url = self.__get_largest_compatible_poster_url(film)
+        caption.log_lines(diary_entry)
+        caption.line()
+        caption.film_lines(film, film_stats)
+        photo_url = self.poster_selector.select_url(film)
         review = self.__create_review_message(diary_entry.get("review", None))
 
-        return MemberEvent(photo_url, caption, review)
+        return MemberEvent(photo_url, caption.build(), review)
 
     def _process_review_activity(self, activity: dict) -> MemberEvent:
         review_entry = activity["review"]
         film = review_entry["film"]
         member = activity["member"]
-        film_stats = self.letterboxd_client.get_film_statistics(film["id"])
-
-        caption = "📝 {} reviewed:\n".format(
-            TelegramUtil.escape_md(member["displayName"]),
-        )
-        caption += self.__log_lines(review_entry)
-        caption += "\n"
-        caption += self.__film_lines(film, film_stats)
-        photo_url = self.__get_largest_compatible_poster_url(film)
+        film_stats = self.__get_film_statistics(film["id"])
+
+        caption = CaptionBuilder()
+        caption.line("📝 {} reviewed:".format(member["displayName"]))
+        caption.log_lines(review_entry)
+        caption.line()
+        caption.film_lines(film, film_stats)
+        photo_url = self.poster_selector.select_url(film)
         review = self.__create_review_message(review_entry.get("review", None))
 
-        return MemberEvent(photo_url, caption, review)
+        return MemberEvent(photo_url, caption.build(), review)
 
     def _process_watchlist_activity(self, activity: dict) -> MemberEvent:
         film = activity["film"]
         member = activity["member"]
-        film_stats = self.letterboxd_client.get_film_statistics(film["id"])
+        film_stats = self.__get_film_statistics(film["id"])
 
-        caption = "⌛ {} added to {} watchlist:\n".format(
-            TelegramUtil.escape_md(member["displayName"]),
-            TelegramUtil.escape_md(member["pronoun"]["possessiveAdjective"]),
+        caption = CaptionBuilder()
+        caption.line(
+            "⌛ {} added to {} watchlist:".format(
+                member["displayName"], member["pronoun"]["possessiveAdjective"]
+            )
         )
-        caption += "\n"
-        caption += self.__film_lines(film, film_stats)
-        photo_url = self.__get_largest_compatible_poster_url(film)
+        caption.line()
+        caption.film_lines(film, film_stats)
+        photo_url = self.poster_selector.select_url(film)
 
-        return MemberEvent(photo_url, caption)
+        return MemberEvent(photo_url, caption.build())
 
     def _process_film_like_activity(self, activity: dict) -> MemberEvent:
         film = activity["film"]
         member = activity["member"]
-        film_stats = self.letterboxd_client.get_film_statistics(film["id"])
+        film_stats = self.__get_film_statistics(film["id"])
 
-        caption = "❤️ {} liked:\n".format(
-            TelegramUtil.escape_md(member["displayName"]),
-        )
-        caption += "\n"
-        caption += self.__film_lines(film, film_stats)
-        photo_url = self.__get_largest_compatible_poster_url(film)
+        caption = CaptionBuilder()
+        caption.line("❤️ {} liked:".format(member["displayName"]))
+        caption.line()
+        caption.film_lines(film, film_stats)
+        photo_url = self.poster_selector.select_url(film)
 
-        return MemberEvent(photo_url, caption)
+        return MemberEvent(photo_url, caption.build())
 
     def _process_film_rating_activity(self, activity: dict) -> MemberEvent:
         film = activity["film"]
         member = activity["member"]
-        film_stats = self.letterboxd_client.get_film_statistics(film["id"])
+        film_stats = self.__get_film_statistics(film["id"])
 
-        caption = "⭐ {} rated:\n".format(
-            TelegramUtil.escape_md(member["displayName"]),
-        )
-        caption += self.__rating_star_line(activity["rating"])
-        caption += "\n"
-        caption += self.__film_lines(film, film_stats)
-        photo_url = self.__get_largest_compatible_poster_url(film)
+        caption = CaptionBuilder()
+        caption.line("⭐ {} rated:".format(member["displayName"]))
+        caption.rating_star_line(activity["rating"])
+        caption.line()
+        caption.film_lines(film, film_stats)
+        photo_url = self.poster_selector.select_url(film)
 
-        return MemberEvent(photo_url, caption)
+        return MemberEvent(photo_url, caption.build())
 
     # def _process_film_watch_activity(self, activity: dict) -> MemberEvent:
     #     pass
 
-    def __get_largest_compatible_poster_url(self, film: dict) -> dict:
-        if "poster" not in film:
-            return None
-        largest_poster = film["poster"]["sizes"][-1]
-        # TODO check for max width, height and ratio
-        return largest_poster["url"]
-
     def __create_review_message(chat_id: int, review: dict | None) -> str | None:
         if review is None:
             return None
@@ -205,235 +274,740 @@ class ActivityHandler:
 
         return f"{title}\n{TelegramUtil.sanitize_html(text)}"
 
-    def __film_lines(self, film: dict, film_stats: dict) -> str:
-        result = ""
-        result += self.__film_title_line(film)
-        result += self.__film_directors_line(film)
-        result += self.__film_rating_line(film, film_stats)
-        result += self.__film_stats_line(film_stats)
-        return result
-
-    def __log_lines(self, log_entry: dict) -> str:
-        result = ""
-        result += self.__log_details_line(log_entry)
-        result += self.__log_tags_line(log_entry)
-        return result
-
-    def __film_title_line(self, film: dict) -> str:
-        letterboxd_link = ""
-        for link in film["links"]:
-            if link["type"] == "letterboxd":
-                letterboxd_link = link["url"]
-                break
-
-        line = "[{}]({})".format(TelegramUtil.escape_md(film["name"]), letterboxd_link)
-        if "releaseYear" in film:
-            line += " \\({}\\)".format(film["releaseYear"])
-        line += "\n"
-
-        return line
-
-    def __film_directors_line(self, film: dict) -> str:
-        if "directors" not in film or len(film["directors"]) == 0:
-            return ""
-        line = TelegramUtil.escape_md(f"{film['directors'][0]['name']}")
-        if len(film["directors"]) > 1:
-            line += TelegramUtil.escape_md(f" +{len(film['directors']) - 1}")
-        return f"{line}\n"
-
-    def __film_rating_line(self, film: dict, film_stats: dict) -> str:
-        result = TelegramUtil.escape_md(
-            self.__get_rating_histogram_string(film_stats["ratingsHistogram"])
-        )
-        if "rating" in film:
-            result += TelegramUtil.escape_md(f" {round(film['rating'], 1)}")
-        result += "\n"
-
-        return result
-
-    def __film_stats_line(self, film_stats: dict) -> str:
-        return TelegramUtil.escape_md(
-            "👁️ {} ❤️ {} 🗒️ {}\n".format(
-                self.__round_number_with_suffix(film_stats["counts"]["watches"]),
-                self.__round_number_with_suffix(film_stats["counts"]["likes"]),
-                self.__round_number_with_suffix(film_stats["counts"]["reviews"]),
-            )
-        )
-
-    def __log_details_line(self, log_entry: dict) -> str:
-        line = ""
-        if "rating" in log_entry:
-            line += TelegramUtil.escape_md(
-                f"{self.__get_star_string(log_entry['rating'])}"
-            )
-        if "like" in log_entry and log_entry["like"]:
-            line += TelegramUtil.escape_md(" ❤️")
-        if "diaryDetails" in log_entry and log_entry["diaryDetails"]["rewatch"]:
-            line += TelegramUtil.escape_md(" 🔄")
-        if "review" in log_entry:
-            line += TelegramUtil.escape_md(" 📝")
-        return f"{line.strip()}\n"
-
-    def __log_tags_line(self, log_entry: dict) -> str:
-        result = ""
-        if len(log_entry["tags2"]) > 0:
-            first = True
-            for tag in log_entry["tags2"]:
-                result += TelegramUtil.escape_md(
-                    f"{" " if not first else ""}#{tag['displayTag']}"
-                )
-                first = False
-            result += "\n"
-        return result
-
-    def __rating_star_line(self, rating: float) -> str:
-        return TelegramUtil.escape_md(f"{self.__get_star_string(rating)}\n")
-
-    def __get_rating_histogram_string(self, ratings_histogram: list) -> str:
-        result = ""
-        biggest_count = max(map(lambda r: r["count"], ratings_histogram))
 
-        chars = "　▁▂▃▄▅▆▇█"
-
-        if biggest_count == 0:
-            result = "　　　　　　　　　　"
-        else:
-            for rating in ratings_histogram:
-                count = rating["count"]
-                result += f"{chars[math.ceil(count/biggest_count*8)]}"
-
-        return "[" + result + "]"
-
-    def __get_star_string(self, rating: float) -> str:
-        full_stars = math.floor(rating)
-        half_star = math.ceil(rating - full_stars)
-
-        return "★" * full_stars + "½" * half_star
-
-    def __round_number_with_suffix(self, number: int) -> str:
-        suffixes = ["", "K", "M", "B"]
-        suffix_index = 0
-
-        while number >= 1000:
-            number /= 1000
-            suffix_index += 1
-
-        return f"{round(number, 1)}{suffixes[suffix_index]}"
+@contextmanager
+def measure_telegram_send(method: str):
+    status = "error"
+    try:
+        with metrics.TELEGRAM_SEND_DURATION.time(method=method):
+            yield
+        status = "ok"
+    finally:
+        metrics.TELEGRAM_SENDS.inc(method=method, status=status)
 
 
-async def send_member_event(chat_id: int, event: MemberEvent):
+@tracing.traced("send_member_event")
+async def send_member_event(chat_id: int, event: MemberEvent, file_cache: FileIdCache):
     photo_url = event.photo_url
     caption = event.caption
     review = event.review
 
     if photo_url:
-        await app.bot.send_photo(
-            chat_id, photo_url, caption=caption, parse_mode="MarkdownV2"
-        )
+
+        async def send_photo(photo: str):
+            with measure_telegram_send("send_photo"):
+                return await app_context.bot.send_photo(
+                    chat_id, photo, caption=caption, parse_mode="MarkdownV2"
+                )
+
+        await file_cache.send_photo(photo_url, send_photo)
     else:
-        await app.bot.send_message(chat_id, caption, parse_mode="MarkdownV2")
+        with measure_telegram_send("send_message"):
+            await app_context.bot.send_message(
+                chat_id, caption, parse_mode="MarkdownV2"
+            )
 
     if review:
-        await app.bot.send_message(chat_id, review, parse_mode="HTML")
-
+        with measure_telegram_send("send_message"):
+            await app_context.bot.send_message(chat_id, review, parse_mode="HTML")
+
+
+@tracing.traced("send_member_event_album")
+async def send_member_event_album(
+    chat_id: int, events: list[MemberEvent], file_cache: FileIdCache
+):
+    async def send_media_group(photos: list[str]):
+        media = [
+            InputMediaPhoto(photo, caption=event.caption, parse_mode="MarkdownV2")
+            for photo, event in zip(photos, events)
+        ]
+        with measure_telegram_send("send_media_group"):
+            return await app_context.bot.send_media_group(chat_id, media)
+
+    await file_cache.send_photos(
+        [event.photo_url for event in events], send_media_group
+    )
 
-async def notify():
+    # the album is delivered, so a rejected review must not fail it
+    for event in events:
+        if event.review:
+            try:
+                with measure_telegram_send("send_message"):
+                    await app_context.bot.send_message(
+                        chat_id, event.review, parse_mode="HTML"
+                    )
+            except BadRequest:
+                logging.exception(f"Telegram rejected a review for {chat_id}")
+
+
+async def send_pause():
+    with tracing.span("sleep"):
+        await asyncio.sleep(4)
+
+
+async def send_member_events(
+    chat_id: int,
+    events: list[MemberEvent],
+    file_cache: FileIdCache,
+    delivered: Callable[[MemberEvent], None] = None,
+):
+    """Sends the events in order and calls delivered with the last event of
+    every message or album that is done, so the caller can remember how far
+    the chat got. An event Telegram rejects with a BadRequest won't be
+    accepted on a retry either and is skipped."""
+
+    async def send(batch: list[MemberEvent]):
+        try:
+            if len(batch) == 1:
+                await send_member_event(chat_id, batch[0], file_cache)
+            else:
+                await send_member_event_album(chat_id, batch, file_cache)
+        except BadRequest:
+            if len(batch) > 1:
+                logging.exception(
+                    f"Telegram rejected an album for {chat_id}, sending it one by one"
+                )
+                for event in batch:
+                    await send([event])
+                return
+            logging.exception(f"Telegram rejected an event for {chat_id}, skipping it")
+
+        if delivered is not None:
+            delivered(batch[-1])
+        await send_pause()
+
+    if len(events) < Config.MEDIA_GROUP_THRESHOLD:
+        for event in events:
+            await send([event])
+        return
+
+    # Collapse bursts into albums, keeping events without a photo in order
+    album = []
+    for event in events + [None]:
+        if event is not None and event.photo_url:
+            album.append(event)
+            if len(album) < MEDIA_GROUP_MAX_SIZE:
+                continue
+            event = None
+
+        if len(album) > 0:
+            await send(album)
+        album = []
+
+        if event is not None:
+            await send([event])
+
+
+@prioritized(RequestPriority.NOTIFICATION)
+async def notify(
+    poster_selector: PosterSelector,
+    file_cache: FileIdCache,
+    letterboxd_client: LetterboxdClient,
+    shard_leases: ShardLeaseManager = None,
+):
     logging.basicConfig(level=logging.INFO)
 
-    letterboxd_client = LetterboxdClient.from_config()
+    watchlist_store = WatchlistStore(letterboxd_client, app_context.engine)
+
+    await notify_cycles(
+        poster_selector,
+        file_cache,
+        letterboxd_client,
+        watchlist_store,
+        shard_leases,
+    )
+
 
+async def notify_cycles(
+    poster_selector: PosterSelector,
+    file_cache: FileIdCache,
+    letterboxd_client: LetterboxdClient,
+    watchlist_store: WatchlistStore,
+    shard_leases: ShardLeaseManager | None,
+):
     while True:
-        with Session(engine) as session:
-            # iterate over all follow members
-            for follow_member in session.query(FollowMember).all():
-                # get the chat
-                chat = session.get(Chat, follow_member.chat_id)
-                member_id = follow_member.member_id
-                last_checked_at = follow_member.last_checked_at.replace(
-                    tzinfo=timezone.utc
+        with tracing.cycle("notify"):
+            cycle_start = time.perf_counter()
+            ah = ActivityHandler(app_context.bot, letterboxd_client, poster_selector)
+            with Session(app_context.engine) as session:
+                # fetch the new activities of all follows first, so the
+                # statistics of their films are prefetched in one batch
+                fetched = []
+                now = datetime.now(timezone.utc)
+                # quarantined follows and follows backing off are skipped
+                follow_members = session.query(FollowMember).filter(
+                    FollowMember.quarantined_at.is_(None),
+                    or_(
+                        FollowMember.next_attempt_at.is_(None),
+                        FollowMember.next_attempt_at <= now,
+                    ),
                 )
-
-                logging.info(
-                    "Search activities for {}/{}. Last checked {}".format(
-                        chat.title, member_id, last_checked_at
+                for follow_member in follow_members.all():
+                    # skip follows polled by other notifier instances
+                    if shard_leases is not None and not shard_leases.owns(
+                        follow_member.id
+                    ):
+                        continue
+
+                    # get the chat
+                    chat = session.get(Chat, follow_member.chat_id)
+                    member_id = follow_member.member_id
+                    last_checked_at = follow_member.last_checked_at.replace(
+                        tzinfo=timezone.utc
                     )
-                )
 
-                ah = ActivityHandler(app.bot, letterboxd_client)
-                activities = ah.fetch_activities(member_id, last_checked_at)
+                    logging.info(
+                        "Search activities for {}/{}. Last checked {}".format(
+                            chat.title, member_id, last_checked_at
+                        )
+                    )
 
-                logging.info(
-                    "Found {} new activities for {}/{}".format(
-                        len(activities), chat.title, member_id
+                    # Letterboxd requests run in threads, so the bot keeps
+                    # answering while they wait for the request scheduler
+                    try:
+                        activities = await asyncio.to_thread(
+                            ah.fetch_activities,
+                            member_id,
+                            last_checked_at,
+                            follow_member.type,
+                        )
+                    except Exception as error:
+                        if is_follow_failure(error):
+                            await record_follow_failure(
+                                session, follow_member, chat, error
+                            )
+                        else:
+                            logging.exception(
+                                f"Failed to fetch activities for {chat.title}/{member_id}"
+                            )
+                        continue
+
+                    if follow_member.failure_count > 0:
+                        follow_member.failure_count = 0
+                        follow_member.next_attempt_at = None
+                        session.commit()
+
+                    logging.info(
+                        "Found {} new activities for {}/{}".format(
+                            len(activities), chat.title, member_id
+                        )
                     )
-                )
 
-                events = []
-                for activity in activities:
-                    event = ah.process_activity(activity)
-                    events.append(event)
+                    metrics.ACTIVITIES_FOUND.inc(len(activities))
 
-                if len(events) == 0:
-                    continue
+                    if len(activities) > 0:
+                        fetched.append((follow_member, chat, activities))
 
-                for event in events:
-                    await send_member_event(chat.id, event)
-                    await asyncio.sleep(4)
+                await asyncio.to_thread(
+                    ah.prefetch_film_statistics,
+                    [
+                        activity
+                        for _, _, activities in fetched
+                        for activity in activities
+                    ],
+                )
 
-                follow_member.last_checked_at = events[-1].when_created
-                session.commit()
+                for follow_member, chat, activities in fetched:
+                    # the shard may have been taken over while fetching
+                    if shard_leases is not None and not shard_leases.owns(
+                        follow_member.id
+                    ):
+                        continue
+
+                    # remember every delivered event right away, so a failing
+                    # send doesn't repeat the ones before it in the next cycle
+                    def delivered(event: MemberEvent):
+                        follow_member.last_checked_at = event.when_created
+                        session.commit()
+
+                    try:
+                        await send_activities(
+                            ah,
+                            watchlist_store,
+                            file_cache,
+                            follow_member,
+                            activities,
+                            delivered,
+                        )
+                    except Exception:
+                        session.rollback()
+                        logging.exception(
+                            "Failed to send activities to {}/{}".format(
+                                chat.title, follow_member.member_id
+                            )
+                        )
+                        continue
+
+                    follow_member.last_checked_at = datetime.fromisoformat(
+                        activities[-1]["whenCreated"]
+                    )
+                    session.commit()
 
-        logging.info("Done. Sleeping for 2 minutes")
-        await asyncio.sleep(2 * 60)
+            metrics.CYCLE_DURATION.observe(
+                time.perf_counter() - cycle_start, job="notify"
+            )
+            logging.info("Done. Sleeping for 2 minutes")
+            with tracing.span("sleep"):
+                await asyncio.sleep(2 * 60)
+
+
+async def send_activities(
+    ah: ActivityHandler,
+    watchlist_store: WatchlistStore,
+    file_cache: FileIdCache,
+    follow_member: FollowMember,
+    activities: list[dict],
+    delivered: Callable[[MemberEvent], None] = None,
+):
+    events = []
+    for activity in activities:
+        # an activity that can't be rendered must not hold up the ones after it
+        try:
+            event = await asyncio.to_thread(ah.process_activity, activity)
+        except Exception:
+            logging.exception(f"Failed to process activity {activity.get('type')}")
+            continue
+        events.append(event)
+        if follow_member.type == FollowMemberType.MEMBER:
+            watchlist_store.apply_activity(follow_member.member_id, activity)
+
+    await send_member_events(follow_member.chat_id, events, file_cache, delivered)
+
+
+def is_follow_failure(error: Exception) -> bool:
+    """Whether a failed poll points at the followed member, a deleted or
+    private profile, rather than at Letterboxd or its authorization being
+    unavailable. Only a 404 or 403 of the activity request itself counts."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    if not error.request.url.path.endswith("/activity"):
+        return False
+    return error.response.status_code in (403, 404)
+
+
+async def record_follow_failure(
+    session: Session,
+    follow_member: FollowMember,
+    chat: Chat,
+    error: httpx.HTTPStatusError,
+):
+    """Doubles the wait before the next poll of a follow with every failure
+    in a row, and quarantines it after NOTIFY_FAILURE_LIMIT of them."""
+    now = datetime.now(timezone.utc)
+    member_id = follow_member.member_id
+    follow_member.failure_count += 1
+    failure_count = follow_member.failure_count
+
+    if failure_count < Config.NOTIFY_FAILURE_LIMIT:
+        backoff = timedelta(
+            seconds=Config.NOTIFY_BACKOFF_SECONDS * 2 ** (failure_count - 1)
+        )
+        follow_member.next_attempt_at = now + backoff
+        session.commit()
+        metrics.FOLLOW_FAILURES.inc(result="backoff")
+        logging.warning(
+            f"Polling {chat.title}/{member_id} failed {failure_count} times "
+            f"({error}), retrying in {backoff}"
+        )
+        return
 
+    follow_member.quarantined_at = now
+    session.commit()
+    metrics.FOLLOW_FAILURES.inc(result="quarantine")
+    logging.warning(
+        f"Quarantined {chat.title}/{member_id} after {failure_count} failures ({error})"
+    )
 
-async def todo_popular():
+    if follow_member.type == FollowMemberType.FOLLOWING:
+        followed = f"everyone the Letterboxd member with id {member_id} follows"
+        command = "/follownetwork"
+    else:
+        followed = f"the Letterboxd member with id {member_id}"
+        command = "/follow"
+    text = (
+        f"⚠️ Stopped following {followed}: "
+        f"their activity couldn't be loaded {failure_count} times in a row "
+        f"(HTTP {error.response.status_code}). The profile may have been "
+        f"deleted or made private. Send {command} to follow again."
+    )
+    try:
+        with measure_telegram_send("send_message"):
+            await app_context.bot.send_message(chat.id, text)
+    except Exception:
+        logging.exception(f"Failed to send the quarantine notice to {chat.title}")
+
+
+@prioritized(RequestPriority.POPULAR_TODO)
+async def todo_popular(
+    poster_selector: PosterSelector,
+    file_cache: FileIdCache,
+    letterboxd_client: LetterboxdClient,
+    shard_leases: ShardLeaseManager = None,
+):
     logger = logging.getLogger("todo_popular")
-    letterboxd_client = LetterboxdClient.from_config()
     letterboxd_ext = LetterboxdExt(letterboxd_client)
 
     logger.info("Starting todo_popular")
 
-    with Session(engine) as session:
+    cycle_start = time.perf_counter()
+    with Session(app_context.engine) as session:
         for popular_todo in session.query(PopularTodo).all():
+            # popular todos are split between the instances like follows
+            if shard_leases is not None and not shard_leases.owns(popular_todo.id):
+                continue
+
             chat = session.get(Chat, popular_todo.chat_id)
-            next_film, next_film_rank = letterboxd_ext.get_next_popular_movie(
-                popular_todo.member_id
+            next_film, next_film_rank = await asyncio.to_thread(
+                letterboxd_ext.get_next_popular_movie, popular_todo.member_id
             )
 
             if (
                 next_film["id"] != popular_todo.next_film_id
                 or next_film_rank != popular_todo.next_rank
             ):
-                photo_url = next_film["poster"]["sizes"][-1]["url"]
+                photo_url = poster_selector.select_url(next_film)
                 caption = "🎥 Next popular movie: \#{} [{}]({})".format(
                     next_film_rank,
                     TelegramUtil.escape_md(next_film["name"]),
                     next_film["links"][0]["url"],
                 )
 
-                await app.bot.send_photo(
-                    chat.id, photo_url, caption=caption, parse_mode="MarkdownV2"
-                )
+                if photo_url:
+
+                    async def send_photo(photo: str):
+                        with measure_telegram_send("send_photo"):
+                            return await app_context.bot.send_photo(
+                                chat.id,
+                                photo,
+                                caption=caption,
+                                parse_mode="MarkdownV2",
+                            )
+
+                    await file_cache.send_photo(photo_url, send_photo)
+                else:
+                    with measure_telegram_send("send_message"):
+                        await app_context.bot.send_message(
+                            chat.id, caption, parse_mode="MarkdownV2"
+                        )
 
                 popular_todo.next_film_id = next_film["id"]
                 popular_todo.next_rank = next_film_rank
                 session.commit()
 
+        metrics.CYCLE_DURATION.observe(
+            time.perf_counter() - cycle_start, job="todo_popular"
+        )
         logger.info("Done. Sleeping for 60 minutes")
         await asyncio.sleep(60 * 60)
 
 
+# Matching showtimes is no more urgent than the popular todos
+@prioritized(RequestPriority.POPULAR_TODO)
+async def watchlist_showtimes(
+    letterboxd_client: LetterboxdClient, shard_leases: ShardLeaseManager = None
+):
+    logger = logging.getLogger("watchlist_showtimes")
+    if len(Config.SHOWTIME_CINEMAS) == 0:
+        logger.info("No cinemas configured, not matching showtimes")
+        return
+
+    watchlist_store = WatchlistStore(letterboxd_client, app_context.engine)
+    imdb_film_resolver = ImdbFilmResolver(letterboxd_client, app_context.engine)
+    scraper = KinoDeScaper(program_store=KinoDeProgramStore(app_context.engine))
+
+    while True:
+        if shard_leases is not None and not shard_leases.owns_job(
+            "watchlist_showtimes"
+        ):
+            logger.info("Run by another instance. Sleeping for 6 hours")
+            await asyncio.sleep(6 * 60 * 60)
+            continue
+
+        cycle_start = time.perf_counter()
+        try:
+            await watchlist_showtimes_cycle(
+                letterboxd_client, watchlist_store, imdb_film_resolver, scraper
+            )
+        except Exception:
+            logger.exception("Failed to match watchlists with showtimes")
+
+        metrics.CYCLE_DURATION.observe(
+            time.perf_counter() - cycle_start, job="watchlist_showtimes"
+        )
+        logger.info("Done. Sleeping for 6 hours")
+        await asyncio.sleep(6 * 60 * 60)
+
+
+async def watchlist_showtimes_cycle(
+    letterboxd_client: LetterboxdClient,
+    watchlist_store: WatchlistStore,
+    imdb_film_resolver: ImdbFilmResolver,
+    scraper: KinoDeScaper,
+):
+    logger = logging.getLogger("watchlist_showtimes")
+
+    # Unchanged programs are answered with a 304 and served from memory, so
+    # watchlist additions are matched against them as well
+    films = await scraper.scrape_films_async(Config.SHOWTIME_CINEMAS)
+    films = upcoming_films(films, datetime.now(timezone.utc))
+
+    imdb_films = await asyncio.to_thread(
+        imdb_film_resolver.resolve, [film.imdb_id for film in films]
+    )
+
+    showing_films = {}
+    for film in films:
+        imdb_film = imdb_films.get(film.imdb_id)
+        if imdb_film is not None and imdb_film.film_id is not None:
+            showing_films[imdb_film.film_id] = film
+
+    logger.info(f"Found {len(showing_films)} films showing in cinemas")
+
+    with Session(app_context.engine) as session:
+        # films that stopped showing are announced again when they return.
+        # The cached IMDb ids are used, so a film whose resolution failed
+        # this time still counts as showing.
+        scraped_film_ids = select(ImdbFilm.film_id).where(
+            ImdbFilm.imdb_id.in_([film.imdb_id for film in films]),
+            ImdbFilm.film_id.is_not(None),
+        )
+        session.execute(
+            delete(ShowtimeNotification).where(
+                ShowtimeNotification.film_id.not_in(scraped_film_ids)
+            )
+        )
+        session.commit()
+
+        follow_members = (
+            session.query(FollowMember)
+            .filter(
+                FollowMember.type == FollowMemberType.MEMBER,
+                FollowMember.quarantined_at.is_(None),
+            )
+            .all()
+        )
+        for follow_member in follow_members:
+            try:
+                await send_watchlist_showtimes(
+                    session,
+                    letterboxd_client,
+                    watchlist_store,
+                    follow_member,
+                    showing_films,
+                )
+            except Exception:
+                session.rollback()
+                logger.exception(
+                    "Failed to match showtimes for {}/{}".format(
+                        follow_member.chat_id, follow_member.member_id
+                    )
+                )
+
+
+async def send_watchlist_showtimes(
+    session: Session,
+    letterboxd_client: LetterboxdClient,
+    watchlist_store: WatchlistStore,
+    follow_member: FollowMember,
+    showing_films: dict[str, KinoDeFilm],
+):
+    """Sends the films on the member's watchlist that are showing and
+    weren't sent to the chat before."""
+    chat_id = follow_member.chat_id
+    member_id = follow_member.member_id
+
+    watchlist = await asyncio.to_thread(watchlist_store.get_film_ids, member_id)
+    notified = set(
+        session.scalars(
+            select(ShowtimeNotification.film_id).where(
+                ShowtimeNotification.chat_id == chat_id,
+                ShowtimeNotification.member_id == member_id,
+            )
+        )
+    )
+    film_ids = (watchlist & showing_films.keys()) - notified
+    if len(film_ids) == 0:
+        return
+
+    member = await asyncio.to_thread(letterboxd_client.get_member, member_id)
+    texts = create_watchlist_showtimes_messages(
+        member, [showing_films[film_id] for film_id in film_ids]
+    )
+    for text in texts:
+        with measure_telegram_send("send_message"):
+            await app_context.bot.send_message(chat_id, text, parse_mode="MarkdownV2")
+        await send_pause()
+
+    now = datetime.now(timezone.utc)
+    session.add_all(
+        ShowtimeNotification(
+            chat_id=chat_id, member_id=member_id, film_id=film_id, notified_at=now
+        )
+        for film_id in film_ids
+    )
+    session.commit()
+
+
+def upcoming_films(films: list[KinoDeFilm], now: datetime) -> list[KinoDeFilm]:
+    """Returns the films with their playtimes from now on, leaving out films
+    without any."""
+    now_ts = now.timestamp()
+    result = []
+    for film in films:
+        playtimes = [
+            playtime for playtime in film.playtimes if playtime.showtime_ts >= now_ts
+        ]
+        if len(playtimes) > 0:
+            result.append(
+                KinoDeFilm(
+                    title=film.title,
+                    page_url=film.page_url,
+                    poster_url=film.poster_url,
+                    imdb_id=film.imdb_id,
+                    playtimes=playtimes,
+                )
+            )
+    return result
+
+
+@prioritized(RequestPriority.POPULAR_TODO)
+async def film_statistics(
+    letterboxd_client: LetterboxdClient,
+    film_store: FilmStore,
+    shard_leases: ShardLeaseManager = None,
+):
+    logger = logging.getLogger("film_statistics")
+
+    while True:
+        if shard_leases is not None and not shard_leases.owns_job("film_statistics"):
+            logger.info("Run by another instance. Sleeping for 30 minutes")
+            await asyncio.sleep(30 * 60)
+            continue
+
+        cycle_start = time.perf_counter()
+        # renews the statistics of recently seen films before they expire,
+        # so notify() renders from the film table
+        try:
+            refreshed = await asyncio.to_thread(
+                film_store.refresh_statistics, letterboxd_client
+            )
+            logger.info(f"Refreshed {refreshed} film statistics")
+        except Exception:
+            logger.exception("Failed to refresh film statistics")
+
+        metrics.CYCLE_DURATION.observe(
+            time.perf_counter() - cycle_start, job="film_statistics"
+        )
+        logger.info("Done. Sleeping for 30 minutes")
+        await asyncio.sleep(30 * 60)
+
+
+def create_watchlist_showtimes_messages(
+    member: dict, films: list[KinoDeFilm]
+) -> list[str]:
+    """Lists the films with their next playtimes, split into as many
+    messages as needed to stay below Telegram's length limit."""
+    header = CaptionBuilder()
+    header.line(
+        "🍿 {} films from {}'s watchlist are showing:".format(
+            len(films), member["displayName"]
+        )
+    )
+    messages = [header.build()]
+
+    for film in sorted(films, key=lambda film: film.playtimes[0].showtime_ts):
+        caption = CaptionBuilder()
+        caption.line()
+        caption.line(film.title)
+        for playtime in film.playtimes[:3]:
+            caption.line(
+                "{} - {}".format(
+                    playtime.showtime.strftime("%a %d.%m. %H:%M"),
+                    playtime.cinema.display_name,
+                )
+            )
+        if len(film.playtimes) > 3:
+            caption.line(f"+{len(film.playtimes) - 3} more")
+        block = caption.build()
+
+        if len(messages[-1]) + len(block) > TELEGRAM_MESSAGE_MAX_LENGTH:
+            messages.append(block.lstrip("\n"))
+        else:
+            messages[-1] += block
+    return messages
+
+
 def main():
     Config.load()
     return asyncio.run(main_threads())
 
 
 async def main_threads():
-    await asyncio.gather(
-        notify(),
-        todo_popular(),
-    )
+    await run_jobs()
+
+
+async def supervise(job: str, start: Callable[[], Awaitable]):
+    """Runs the coroutine of a job, starting it again a minute after it
+    crashed, so one failing job doesn't stop the others or the bot."""
+    while True:
+        try:
+            return await start()
+        except Exception:
+            metrics.JOB_RESTARTS.inc(job=job)
+            logging.exception(f"Job {job} crashed, restarting in 1 minute")
+        await asyncio.sleep(60)
+
+
+async def run_jobs():
+    """Runs the notifier jobs, sharing one Letterboxd client (and with it
+    one access token and the film store) and one file_id cache between
+    them."""
+    if Config.METRICS_PORT is not None:
+        await metrics.start_metrics_server(Config.METRICS_PORT, Config.METRICS_HOST)
+
+    letterboxd_client = app_context.letterboxd_client
+    file_cache = app_context.file_cache
+    poster_selector = app_context.poster_selector
+    film_store = app_context.film_store
+
+    # With shards, the jobs split their work with the other instances
+    shard_leases = None
+    renewal = None
+    if Config.NOTIFY_SHARDS > 0:
+        shard_leases = ShardLeaseManager(
+            app_context.engine,
+            Config.NOTIFY_SHARDS,
+            lease_duration=timedelta(seconds=Config.NOTIFY_LEASE_SECONDS),
+        )
+        renewal = asyncio.create_task(shard_leases.keep_renewed())
+
+    try:
+        await asyncio.gather(
+            supervise(
+                "notify",
+                lambda: notify(
+                    poster_selector, file_cache, letterboxd_client, shard_leases
+                ),
+            ),
+            supervise(
+                "todo_popular",
+                lambda: todo_popular(
+                    poster_selector, file_cache, letterboxd_client, shard_leases
+                ),
+            ),
+            supervise(
+                "watchlist_showtimes",
+                lambda: watchlist_showtimes(letterboxd_client, shard_leases),
+            ),
+            supervise(
+                "film_statistics",
+                lambda: film_statistics(letterboxd_client, film_store, shard_leases),
+            ),
+        )
+    finally:
+        if shard_leases is not None:
+            renewal.cancel()
+            shard_leases.release()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+import bot
+import notify
+from letterboxd_followbot.config import Config
+from letterboxd_followbot.context import app_context
+
+
+async def run():
+    """Runs the bot handlers and the notifier jobs on one event loop.
+
+    They share the Telegram application, the database engine, the
+    Letterboxd client with its access token and the file_id cache.
+    """
+    bot.add_handlers()
+
+    application = app_context.application
+    async with application:
+        await application.start()
+        await bot.start_updater()
+        try:
+            await notify.run_jobs()
+        finally:
+            await application.updater.stop()
+            await application.stop()
+
+
+def main():
+    Config.load()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()